@@ -1,46 +1,28 @@
 import pandas as pd
-from datetime import datetime, timedelta
-import re
-from scipy.stats import binomtest, ttest_1samp, chi2_contingency
+import numpy as np
+import argparse
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from stop_events import load_stop_events, service_date_from_path, CACHE_DIR
+from bias_cube import build_bias_cube, rollup, drill_down
+from bias_report import export_bias_results, print_results, EXPORT_FORMATS
+from bias_stats import (binomtest_pvalues, chi2_contingency_2x2, group_moments,
+                        merge_group_moments, pooled_moments, ttest_1samp_from_moments)
 
-def process_trimet_data(html_file_path):
-    with open(html_file_path, 'r', encoding='utf-8') as file:
-        html_content = file.read()
-    
-    stop_events = []
-    trip_sections = re.split(r'<h2>Stop events for PDX_TRIP\s+([^<]+)</h2>', html_content)
-    
-    for i in range(1, len(trip_sections), 2):
-        trip_id = trip_sections[i].strip()
-        table_content = trip_sections[i + 1] if i + 1 < len(trip_sections) else ""
-        
-        row_pattern = r'<tr><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td><td>([^<]+)</td></tr>'
-        
-        matches = re.findall(row_pattern, table_content)
-        
-        for match in matches:
-            try:
-                vehicle_number = int(match[0])
-                arrive_time = int(match[8])
-                location_id = int(match[10])
-                ons = int(match[13])
-                offs = int(match[14])
-                
-                base_date = datetime(2022, 12, 7)
-                tstamp = base_date + timedelta(seconds=arrive_time)
-                
-                stop_events.append({
-                    'trip_id': trip_id,
-                    'vehicle_number': vehicle_number,
-                    'tstamp': tstamp,
-                    'location_id': location_id,
-                    'ons': ons,
-                    'offs': offs
-                })
-            except (ValueError, IndexError):
-                continue
-    
-    return pd.DataFrame(stop_events)
+# Daily stop event dumps picked up by the directory mode, plain or compressed
+STOP_EVENT_FILE_PATTERNS = ['trimet_stopevents_*.html', 'trimet_stopevents_*.html.gz',
+                            'trimet_stopevents_*.html.zst']
+
+# The GPS bias test only needs these columns
+GPS_BIAS_COLUMNS = ['VEHICLE_NUMBER', 'RELPOS']
+GPS_BIAS_DTYPES = {'VEHICLE_NUMBER': np.int32, 'RELPOS': np.float64}
+
+def process_trimet_data(html_file_path, processes=1, cache_dir=CACHE_DIR):
+    # The file is scanned incrementally, one block and one trip at a time;
+    # processes != 1 parses trip sections in parallel. The parsed frame is
+    # cached in cache_dir until the file changes (cache_dir=None to disable)
+    return load_stop_events(html_file_path, cache_dir=cache_dir, processes=processes)
 
 def basic_analysis(stops_df):
     print("Basic Analysis")
@@ -71,37 +53,110 @@ def basic_analysis(stops_df):
     print("5. Boarding percentage:", f"{boarding_pct:.1f}%")
     print()
 
-def validate_cases(stops_df):
+def validate_cases(stops_df, cube=None):
     print("Validation")
     
+    # Both checks are lookups into one (location, vehicle) cube
+    if cube is None:
+        cube = build_bias_cube(stops_df, ['location_id', 'vehicle_number'])
+    
     # Location 6913
-    loc_6913 = stops_df[stops_df['location_id'] == 6913]
+    loc_6913 = drill_down(cube, location_id=6913)
     print("Location 6913:")
     if len(loc_6913) == 0:
         print("  Not found in data")
-        print("  Available locations:", sorted(stops_df['location_id'].unique())[:5], "...")
+        print("  Available locations:", sorted(cube.index.get_level_values('location_id').unique())[:5], "...")
     else:
-        print("  Stops at location:", len(loc_6913))
-        print("  Different buses:", loc_6913['vehicle_number'].nunique())
-        boarding_at_loc = (loc_6913['ons'] >= 1).sum()
-        boarding_pct_loc = (boarding_at_loc / len(loc_6913)) * 100
+        stops_at_loc = loc_6913['n_stops'].sum()
+        print("  Stops at location:", stops_at_loc)
+        print("  Different buses:", len(loc_6913))
+        boarding_at_loc = loc_6913['boarding_stops'].sum()
+        boarding_pct_loc = (boarding_at_loc / stops_at_loc) * 100
         print("  Boarding percentage:", f"{boarding_pct_loc:.1f}%")
     print()
     
     # Vehicle 4062
-    veh_4062 = stops_df[stops_df['vehicle_number'] == 4062]
+    vehicles = rollup(cube, ['vehicle_number'])
     print("Vehicle 4062:")
-    if len(veh_4062) == 0:
+    if 4062 not in vehicles.index:
         print("  Not found in data")
-        print("  Available vehicles:", sorted(stops_df['vehicle_number'].unique())[:5], "...")
+        print("  Available vehicles:", sorted(vehicles.index)[:5], "...")
     else:
-        print("  Total stops:", len(veh_4062))
-        print("  Total boarded:", veh_4062['ons'].sum())
-        print("  Total alighted:", veh_4062['offs'].sum())
-        boarding_veh = (veh_4062['ons'] >= 1).sum()
-        boarding_pct_veh = (boarding_veh / len(veh_4062)) * 100
+        print("  Total stops:", vehicles.at[4062, 'n_stops'])
+        print("  Total boarded:", vehicles.at[4062, 'ons'])
+        print("  Total alighted:", vehicles.at[4062, 'offs'])
+        boarding_pct_veh = vehicles.at[4062, 'boarding_rate'] * 100
         print("  Boarding percentage:", f"{boarding_pct_veh:.1f}%")
 
+def vehicle_stop_counts(stops_df):
+    """
+    Stop counts for every vehicle in a single pass.
+
+    Returns:
+        DataFrame: n_stops, boarding_stops, ons and offs per vehicle_number,
+        sorted by vehicle_number
+    """
+    vehicles, codes = np.unique(stops_df['vehicle_number'].to_numpy(), return_inverse=True)
+    n_vehicles = len(vehicles)
+    ons = stops_df['ons'].to_numpy()
+    offs = stops_df['offs'].to_numpy()
+    return pd.DataFrame({
+        'n_stops': np.bincount(codes, minlength=n_vehicles),
+        'boarding_stops': np.bincount(codes, weights=ons >= 1, minlength=n_vehicles).astype(np.int64),
+        'ons': np.bincount(codes, weights=ons, minlength=n_vehicles).astype(np.int64),
+        'offs': np.bincount(codes, weights=offs, minlength=n_vehicles).astype(np.int64),
+    }, index=pd.Index(vehicles, name='vehicle_number'))
+
+def boarding_bias_table(counts):
+    """
+    Binomial boarding-rate test for every vehicle in a vehicle_stop_counts() frame
+
+    The system rate is taken from the same counts, so the function works on
+    a single day's counts as well as on counts merged across days.
+    """
+    system_boarding_rate = counts['boarding_stops'].sum() / counts['n_stops'].sum()
+    
+    # H0: vehicle boarding rate = system boarding rate
+    # H1: vehicle boarding rate != system boarding rate
+    return pd.DataFrame({
+        'vehicle_id': counts.index.to_numpy(),
+        'total_stops': counts['n_stops'].to_numpy(),
+        'boarding_stops': counts['boarding_stops'].to_numpy(),
+        'boarding_rate': counts['boarding_stops'].to_numpy() / counts['n_stops'].to_numpy(),
+        'p_value': binomtest_pvalues(counts['boarding_stops'], counts['n_stops'], system_boarding_rate)
+    })
+
+def offs_ons_bias_table(counts):
+    """Chi-square offs/ons test for every vehicle in a vehicle_stop_counts() frame"""
+    total_offs = counts['offs'].sum()
+    total_ons = counts['ons'].sum()
+    vehicle_offs = counts['offs'].to_numpy()
+    vehicle_ons = counts['ons'].to_numpy()
+    vehicle_total = vehicle_offs + vehicle_ons
+    
+    # Contingency table per vehicle: this vehicle vs the rest of the fleet
+    contingency_tables = np.stack([
+        np.stack([vehicle_offs, vehicle_ons], axis=1),
+        np.stack([total_offs - vehicle_offs, total_ons - vehicle_ons], axis=1)
+    ], axis=1)
+    chi2_stat, p_value, status = chi2_contingency_2x2(contingency_tables)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        offs_prop = np.where(vehicle_total > 0, vehicle_offs / vehicle_total, 0)
+        ons_prop = np.where(vehicle_total > 0, vehicle_ons / vehicle_total, 0)
+    
+    return pd.DataFrame({
+        'vehicle_id': counts.index.to_numpy(),
+        'vehicle_offs': vehicle_offs,
+        'vehicle_ons': vehicle_ons,
+        'vehicle_total': vehicle_total,
+        'offs_proportion': offs_prop,
+        'ons_proportion': ons_prop,
+        'chi2_statistic': chi2_stat,
+        'p_value': p_value,
+        'status': status
+    })
+
 def find_biased_vehicles(stops_df):
     print("Bias Detection Analysis")
     print()
@@ -114,42 +169,12 @@ def find_biased_vehicles(stops_df):
     print(f"System-wide boarding rate: {system_boarding_rate:.3f} ({total_boarding_events}/{total_events})")
     print()
     
-    # Analyze each vehicle
-    vehicle_results = []
-    
-    for vehicle_id in sorted(stops_df['vehicle_number'].unique()):
-        vehicle_data = stops_df[stops_df['vehicle_number'] == vehicle_id]
-        
-        # Count stop events for this vehicle
-        n_stops = len(vehicle_data)
-        
-        # Count stops with boardings
-        boarding_stops = (vehicle_data['ons'] >= 1).sum()
-        
-        # Calculate vehicle boarding percentage
-        vehicle_boarding_rate = boarding_stops / n_stops
-        
-        # Perform binomial test
-        # H0: vehicle boarding rate = system boarding rate
-        # H1: vehicle boarding rate != system boarding rate
-        test_result = binomtest(boarding_stops, n_stops, system_boarding_rate, alternative='two-sided')
-        p_value = test_result.pvalue
-        
-        vehicle_results.append({
-            'vehicle_id': vehicle_id,
-            'total_stops': n_stops,
-            'boarding_stops': boarding_stops,
-            'boarding_rate': vehicle_boarding_rate,
-            'p_value': p_value
-        })
-    
-    # Create results dataframe
-    results_df = pd.DataFrame(vehicle_results)
+    # Per-vehicle counts for the whole fleet in one pass
+    results_df = boarding_bias_table(vehicle_stop_counts(stops_df))
     
     print("Vehicle Analysis Results:")
-    print("Vehicle  Stops  Boarding_Stops  Rate    P_Value")
-    for _, row in results_df.iterrows():
-        print(f"{row['vehicle_id']:<8} {row['total_stops']:<6} {row['boarding_stops']:<14} {row['boarding_rate']:.3f}   {row['p_value']:.4f}")
+    print_results(results_df, {'vehicle_id': '{}', 'total_stops': '{}', 'boarding_stops': '{}',
+                               'boarding_rate': '{:.3f}', 'p_value': '{:.4f}'})
     print()
     
     # Find vehicles with significant bias (p < 0.05)
@@ -159,9 +184,7 @@ def find_biased_vehicles(stops_df):
     if len(biased_vehicles) == 0:
         print("None found")
     else:
-        print("Vehicle_ID  P_Value")
-        for _, row in biased_vehicles.iterrows():
-            print(f"{row['vehicle_id']:<10}  {row['p_value']:.4f}")
+        print_results(biased_vehicles, {'vehicle_id': '{}', 'p_value': '{:.4f}'})
     print()
     
     return results_df
@@ -189,6 +212,35 @@ def process_gps_data(csv_file_path):
         print(f"Error loading GPS data: {e}")
         return None
 
+def aggregate_gps_data(csv_file_path, chunksize=1_000_000):
+    """
+    Per-vehicle RELPOS sufficient statistics from a chunked read of the GPS CSV
+
+    Only VEHICLE_NUMBER and RELPOS are parsed, so memory use depends on the
+    chunk size and the number of vehicles, not on the size of the file.
+    """
+    try:
+        relpos_moments = None
+        n_records = 0
+        chunks = pd.read_csv(csv_file_path, usecols=GPS_BIAS_COLUMNS,
+                             dtype=GPS_BIAS_DTYPES, chunksize=chunksize)
+        for chunk in chunks:
+            n_records += len(chunk)
+            chunk_moments = group_moments(chunk['VEHICLE_NUMBER'], chunk['RELPOS'])
+            relpos_moments = merge_group_moments(relpos_moments, chunk_moments)
+        
+        print(f"GPS data aggregated: {n_records} records, "
+              f"{0 if relpos_moments is None else len(relpos_moments)} vehicles")
+        print()
+        
+        return relpos_moments
+    except FileNotFoundError:
+        print("GPS CSV file not found. Skipping GPS bias analysis.")
+        return None
+    except Exception as e:
+        print(f"Error loading GPS data: {e}")
+        return None
+
 def find_offs_ons_biased_vehicles(stops_df):
     """Find vehicles with biased offs/ons ratios using chi-square test"""
     print("Offs/Ons Ratio Bias Detection Analysis")
@@ -211,64 +263,18 @@ def find_offs_ons_biased_vehicles(stops_df):
     print(f"  Ons proportion:  {system_ons_prop:.4f}")
     print()
     
-    # 2. Analyze each vehicle
-    vehicle_ratio_results = []
+    # 2. Analyze every vehicle at once from the per-vehicle totals
+    ratio_results_df = offs_ons_bias_table(vehicle_stop_counts(stops_df))
     
-    for vehicle_id in sorted(stops_df['vehicle_number'].unique()):
-        vehicle_data = stops_df[stops_df['vehicle_number'] == vehicle_id]
-        
-        # Calculate vehicle totals
-        vehicle_offs = vehicle_data['offs'].sum()
-        vehicle_ons = vehicle_data['ons'].sum()
-        vehicle_total = vehicle_offs + vehicle_ons
-        
-        # Skip vehicles with no passenger activity
-        if vehicle_total == 0:
-            continue
-        
-        # Expected values based on system proportions
-        expected_offs = vehicle_total * system_offs_prop
-        expected_ons = vehicle_total * system_ons_prop
-        
-        # Create contingency table for chi-square test
-        # Format: [[observed_offs, observed_ons], [expected_offs, expected_ons]]
-        observed = [vehicle_offs, vehicle_ons]
-        expected = [expected_offs, expected_ons]
-        
-        # Chi-square test using scipy
-        contingency_table = [
-            [vehicle_offs, vehicle_ons],
-            [total_offs - vehicle_offs, total_ons - vehicle_ons]
-        ]
-        
-        try:
-            chi2_stat, p_value, dof, expected_freq = chi2_contingency(contingency_table)
-        except:
-            # Fallback for cases with insufficient data
-            continue
-        
-        # Calculate vehicle proportions
-        vehicle_offs_prop = vehicle_offs / vehicle_total if vehicle_total > 0 else 0
-        vehicle_ons_prop = vehicle_ons / vehicle_total if vehicle_total > 0 else 0
-        
-        vehicle_ratio_results.append({
-            'vehicle_id': vehicle_id,
-            'vehicle_offs': vehicle_offs,
-            'vehicle_ons': vehicle_ons,
-            'vehicle_total': vehicle_total,
-            'offs_proportion': vehicle_offs_prop,
-            'ons_proportion': vehicle_ons_prop,
-            'chi2_statistic': chi2_stat,
-            'p_value': p_value
-        })
-    
-    # Create results dataframe
-    ratio_results_df = pd.DataFrame(vehicle_ratio_results)
+    # Degenerate tables have no test result; they stay in the results with
+    # their status and are listed separately below
+    tested = ratio_results_df[ratio_results_df['status'] == 'ok']
+    degenerate = ratio_results_df[ratio_results_df['status'] != 'ok']
     
     print("Vehicle Offs/Ons Analysis Results:")
-    print("Vehicle  Offs   Ons    Total  Offs_Prop  Ons_Prop   Chi2_Stat  P_Value")
-    for _, row in ratio_results_df.iterrows():
-        print(f"{row['vehicle_id']:<8} {row['vehicle_offs']:<6} {row['vehicle_ons']:<6} {row['vehicle_total']:<6} {row['offs_proportion']:.3f}      {row['ons_proportion']:.3f}      {row['chi2_statistic']:.3f}      {row['p_value']:.6f}")
+    print_results(tested, {'vehicle_id': '{}', 'vehicle_offs': '{}', 'vehicle_ons': '{}', 'vehicle_total': '{}',
+                           'offs_proportion': '{:.3f}', 'ons_proportion': '{:.3f}',
+                           'chi2_statistic': '{:.3f}', 'p_value': '{:.6f}'})
     print()
     
     # Find vehicles with significant offs/ons bias (p < 0.05)
@@ -278,73 +284,75 @@ def find_offs_ons_biased_vehicles(stops_df):
     if len(ratio_biased_vehicles) == 0:
         print("None found")
     else:
-        print("Vehicle_ID  P_Value     Offs_Prop  Ons_Prop")
-        print("-" * 40)
-        for _, row in ratio_biased_vehicles.iterrows():
-            print(f"{row['vehicle_id']:<10}  {row['p_value']:.6f}  {row['offs_proportion']:.3f}      {row['ons_proportion']:.3f}")
+        print_results(ratio_biased_vehicles, {'vehicle_id': '{}', 'p_value': '{:.6f}',
+                                              'offs_proportion': '{:.3f}', 'ons_proportion': '{:.3f}'})
     print()
     
     print(f"Total vehicles with significant offs/ons bias: {len(ratio_biased_vehicles)}")
     
+    if len(degenerate) > 0:
+        print()
+        print(f"Vehicles not tested (degenerate contingency table): {len(degenerate)}")
+        print_results(degenerate, {'vehicle_id': '{}', 'vehicle_offs': '{}', 'vehicle_ons': '{}', 'status': '{}'})
+    
     return ratio_results_df
 
-def find_gps_biased_vehicles(gps_df):
-    """Find vehicles with biased GPS data using t-test"""
-    if gps_df is None:
+def gps_bias_table(relpos_moments):
+    """One-sample RELPOS t-test for every vehicle from per-vehicle moments"""
+    overall_mean = pooled_moments(relpos_moments)['mean']
+    
+    # Need at least 2 values for t-test
+    tested = relpos_moments[relpos_moments['n'] >= 2]
+    
+    # Perform one-sample t-test for every vehicle at once
+    # H0: vehicle mean = overall mean (no bias)
+    # H1: vehicle mean != overall mean (bias exists)
+    t_stat, p_value = ttest_1samp_from_moments(tested['n'], tested['mean'], tested['m2'], overall_mean)
+    
+    return pd.DataFrame({
+        'vehicle_id': tested.index.to_numpy(),
+        'n_measurements': tested['n'].to_numpy(),
+        'vehicle_mean': tested['mean'].to_numpy(),
+        'vehicle_std': np.sqrt(tested['m2'] / tested['n']).to_numpy(),
+        't_statistic': t_stat,
+        'p_value': p_value
+    })
+
+def find_gps_biased_vehicles(gps_df, relpos_moments=None):
+    """
+    Find vehicles with biased GPS data using t-test
+
+    The test only needs per-vehicle RELPOS count, mean and sum of squared
+    deviations; pass them as relpos_moments (see bias_stats.group_moments)
+    to analyze data that was never loaded as a whole, with gps_df=None.
+    """
+    if gps_df is None and relpos_moments is None:
         print("No GPS data available for analysis")
         return
     
     print("GPS Bias Detection Analysis")
     print()
     
-    # 1. Get all RELPOS values for the entire dataset
-    all_relpos = gps_df['RELPOS'].values
-    overall_mean = all_relpos.mean()
+    # 1. Per-vehicle sufficient statistics in one groupby pass
+    if relpos_moments is None:
+        relpos_moments = group_moments(gps_df['VEHICLE_NUMBER'], gps_df['RELPOS'])
+    overall = pooled_moments(relpos_moments)
+    overall_mean = overall['mean']
     
     print(f"Overall RELPOS statistics:")
     print(f"  Mean: {overall_mean:.6f}")
-    print(f"  Std:  {all_relpos.std():.6f}")
-    print(f"  Min:  {all_relpos.min():.6f}")
-    print(f"  Max:  {all_relpos.max():.6f}")
-    print(f"  Total measurements: {len(all_relpos)}")
+    print(f"  Std:  {np.sqrt(overall['m2'] / overall['n']):.6f}")
+    print(f"  Min:  {overall['min']:.6f}")
+    print(f"  Max:  {overall['max']:.6f}")
+    print(f"  Total measurements: {overall['n']}")
     print()
     
     # 2. Analyze each vehicle
-    vehicle_gps_results = []
-    
-    for vehicle_id in sorted(gps_df['VEHICLE_NUMBER'].unique()):
-        vehicle_gps = gps_df[gps_df['VEHICLE_NUMBER'] == vehicle_id]
-        vehicle_relpos = vehicle_gps['RELPOS'].values
-        
-        if len(vehicle_relpos) < 2:  # Need at least 2 values for t-test
-            continue
-            
-        # Calculate vehicle statistics
-        vehicle_mean = vehicle_relpos.mean()
-        vehicle_std = vehicle_relpos.std()
-        n_measurements = len(vehicle_relpos)
-        
-        # Perform one-sample t-test
-        # H0: vehicle mean = overall mean (no bias)
-        # H1: vehicle mean != overall mean (bias exists)
-        t_stat, p_value = ttest_1samp(vehicle_relpos, overall_mean)
-        
-        vehicle_gps_results.append({
-            'vehicle_id': vehicle_id,
-            'n_measurements': n_measurements,
-            'vehicle_mean': vehicle_mean,
-            'vehicle_std': vehicle_std,
-            't_statistic': t_stat,
-            'p_value': p_value
-        })
-    
-    # Create results dataframe
-    gps_results_df = pd.DataFrame(vehicle_gps_results)
+    gps_results_df = gps_bias_table(relpos_moments)
     
     print("GPS Vehicle Analysis Results:")
-    print("Vehicle  Measurements  Mean_RELPOS  Std_RELPOS   T_Stat   P_Value")
-    for _, row in gps_results_df.iterrows():
-        print(f"{row['vehicle_id']:<8} {row['n_measurements']:<12} {row['vehicle_mean']:<11.4f} {row['vehicle_std']:<11.4f} {row['t_statistic']:<8.3f} {row['p_value']:.6f}")
+    print_results(gps_results_df, {'vehicle_id': '{}', 'n_measurements': '{}', 'vehicle_mean': '{:.4f}',
+                                   'vehicle_std': '{:.4f}', 't_statistic': '{:.3f}', 'p_value': '{:.6f}'})
     print()
     
     # Find vehicles with significant GPS bias (p < 0.005)
@@ -354,10 +362,7 @@ def find_gps_biased_vehicles(gps_df):
     if len(gps_biased_vehicles) == 0:
         print("None found")
     else:
-        print("Vehicle_ID  P_Value     Mean_RELPOS")
-        print("-" * 35)
-        for _, row in gps_biased_vehicles.iterrows():
-            print(f"{row['vehicle_id']:<10}  {row['p_value']:.6f}  {row['vehicle_mean']:.6f}")
+        print_results(gps_biased_vehicles, {'vehicle_id': '{}', 'p_value': '{:.6f}', 'vehicle_mean': '{:.6f}'})
     print()
     
     print(f"Total vehicles with significant GPS bias: {len(gps_biased_vehicles)}")
@@ -365,6 +370,70 @@ def find_gps_biased_vehicles(gps_df):
     
     return gps_results_df
 
+def day_vehicle_counts(html_file_path):
+    """Per-vehicle stop counts for one day's stop-event file"""
+    return vehicle_stop_counts(process_trimet_data(html_file_path))
+
+def merge_vehicle_counts(counts_list):
+    """Pool vehicle_stop_counts() frames, e.g. from several days"""
+    return pd.concat(counts_list).groupby(level='vehicle_number').sum()
+
+def analyze_stop_event_directory(directory, processes=None):
+    """
+    Boarding and offs/ons bias per day and pooled over every day in a directory
+
+    Each trimet_stopevents_*.html file (or its .gz/.zst archive) is parsed
+    and reduced to per-vehicle counts in a worker process; only those small
+    per-day aggregates come back, and the pooled tests run on their sum.
+    """
+    days = {}
+    for path in sorted(path for pattern in STOP_EVENT_FILE_PATTERNS
+                       for path in glob.glob(os.path.join(directory, pattern))):
+        # A day present both plain and compressed is read once, from the plain file
+        days.setdefault(os.path.splitext(path)[0] if not path.endswith('.html') else path, path)
+    paths = sorted(days.values())
+    if not paths:
+        print(f"No stop event files found in {directory}")
+        return None
+    
+    print(f"Multi-day Bias Analysis: {len(paths)} days in {directory}")
+    print()
+    
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        day_counts = list(pool.map(day_vehicle_counts, paths))
+    service_dates = [service_date_from_path(path) for path in paths]
+    
+    # Per-day tests, tagged with the service date
+    daily_boarding = pd.concat([boarding_bias_table(counts).assign(service_date=day)
+                                for day, counts in zip(service_dates, day_counts)], ignore_index=True)
+    daily_ratio = pd.concat([offs_ons_bias_table(counts).assign(service_date=day)
+                             for day, counts in zip(service_dates, day_counts)], ignore_index=True)
+    
+    # Pooled tests from the merged per-day aggregates
+    pooled_counts = merge_vehicle_counts(day_counts)
+    pooled_boarding = boarding_bias_table(pooled_counts)
+    pooled_ratio = offs_ons_bias_table(pooled_counts)
+    
+    print("Date        Vehicles  Stops     Boarding_Bias  Offs/Ons_Bias")
+    for day, counts in zip(service_dates, day_counts):
+        boarding_biased = ((daily_boarding['service_date'] == day) & (daily_boarding['p_value'] < 0.05)).sum()
+        ratio_biased = ((daily_ratio['service_date'] == day) & (daily_ratio['p_value'] < 0.05)).sum()
+        print(f"{day:%Y-%m-%d}  {len(counts):<9} {counts['n_stops'].sum():<9} {boarding_biased:<14} {ratio_biased}")
+    print()
+    
+    print(f"Pooled over {len(paths)} days: {len(pooled_counts)} vehicles, {pooled_counts['n_stops'].sum()} stops")
+    print(f"  Vehicles with significant boarding bias (p < 0.05): {(pooled_boarding['p_value'] < 0.05).sum()}")
+    print(f"  Vehicles with significant offs/ons bias (p < 0.05): {(pooled_ratio['p_value'] < 0.05).sum()}")
+    print()
+    
+    return {
+        'daily_boarding': daily_boarding,
+        'daily_offs_ons': daily_ratio,
+        'pooled_counts': pooled_counts,
+        'pooled_boarding': pooled_boarding,
+        'pooled_offs_ons': pooled_ratio,
+    }
+
 def show_sample(stops_df):
     print("Sample data:")
     print(stops_df.head())
@@ -374,19 +443,43 @@ def show_sample(stops_df):
     print()
 
 if __name__ == "__main__":
-    stops_df = process_trimet_data('trimet_stopevents_2022-12-07.html')
-    
-    show_sample(stops_df)
-    basic_analysis(stops_df)
-    validate_cases(stops_df)
-    
-    # Bias detection analysis
-    bias_results = find_biased_vehicles(stops_df)
-    
-    # Offs/Ons ratio bias detection
-    ratio_bias_results = find_offs_ons_biased_vehicles(stops_df)
-    
-    # GPS bias detection analysis
-    gps_df = process_gps_data('trimet_gps_data.csv')  # Adjust filename as needed
-    if gps_df is not None:
-        gps_bias_results = find_gps_biased_vehicles(gps_df)
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--file", default='trimet_stopevents_2022-12-07.html')
+    parser.add_argument("-d", "--dir", help="analyze every trimet_stopevents_*.html[.gz|.zst] in this directory")
+    parser.add_argument("-p", "--processes", type=int, default=None,
+                        help="worker processes (default: every CPU with -d, 1 for a single file)")
+    parser.add_argument("-g", "--gps", default='trimet_gps_data.csv')  # Adjust filename as needed
+    parser.add_argument("-o", "--output", help="directory to export the results tables to")
+    parser.add_argument("--formats", nargs='+', choices=EXPORT_FORMATS, default=['csv', 'json'])
+    args = parser.parse_args()
+    results = {}
+    
+    if args.dir:
+        # Per-day and pooled bias across many days
+        multi_day_results = analyze_stop_event_directory(args.dir, args.processes)
+        if multi_day_results is not None:
+            results.update({name: multi_day_results[name] for name in
+                            ['daily_boarding', 'daily_offs_ons', 'pooled_boarding', 'pooled_offs_ons']})
+    else:
+        stops_df = process_trimet_data(args.file, processes=args.processes or 1)
+        
+        show_sample(stops_df)
+        basic_analysis(stops_df)
+        validate_cases(stops_df)
+        
+        # Bias detection analysis
+        bias_results = find_biased_vehicles(stops_df)
+        
+        # Offs/Ons ratio bias detection
+        ratio_bias_results = find_offs_ons_biased_vehicles(stops_df)
+        results.update(boarding=bias_results, offs_ons=ratio_bias_results)
+    
+    # GPS bias detection analysis, aggregated chunk by chunk
+    gps_moments = aggregate_gps_data(args.gps)
+    if gps_moments is not None:
+        gps_bias_results = find_gps_biased_vehicles(None, gps_moments)
+        results['gps'] = gps_bias_results
+
+    if args.output:
+        export_bias_results(results, args.output, args.formats)
+        print(f"Results written to {args.output}")
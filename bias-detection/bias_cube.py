@@ -0,0 +1,95 @@
+import pandas as pd
+import numpy as np
+
+# Dimensions the cube can be built over; 'hour' is derived from tstamp
+CUBE_DIMENSIONS = ['vehicle_number', 'location_id', 'hour', 'trip_id']
+# Additive measures stored in every cube cell
+CUBE_MEASURES = ['n_stops', 'boarding_stops', 'ons', 'offs']
+
+
+def _dimension_values(stops_df, dimension):
+    if dimension == 'hour':
+        return stops_df['tstamp'].dt.hour.to_numpy()
+    if dimension not in CUBE_DIMENSIONS:
+        raise ValueError(f"Unknown cube dimension {dimension!r}; expected one of {CUBE_DIMENSIONS}")
+    return stops_df[dimension].to_numpy()
+
+
+def build_bias_cube(stops_df, keys=('vehicle_number', 'location_id')):
+    """
+    Boarding/offs/ons aggregates for every combination of the given keys.
+
+    The rows are sorted once on the factorized keys and each run of equal
+    keys is summed with np.add.reduceat, so the whole cube costs one sort
+    instead of one boolean filter per drill-down.
+
+    Args:
+        stops_df (DataFrame): Stop events as returned by process_trimet_data
+        keys (list): Any of vehicle_number, location_id, hour, trip_id
+
+    Returns:
+        DataFrame: n_stops, boarding_stops, ons, offs and boarding_rate per
+        key combination, indexed (and sorted) by the keys. Rows with a
+        missing key are left out, as groupby does.
+    """
+    keys = list(keys)
+    codes = []
+    uniques = []
+    for key in keys:
+        key_codes, key_uniques = pd.factorize(_dimension_values(stops_df, key), sort=True)
+        codes.append(key_codes)
+        uniques.append(key_uniques)
+
+    # factorize codes missing keys as -1; drop those rows as groupby does
+    keep = np.logical_and.reduce([key_codes >= 0 for key_codes in codes])
+    codes = [key_codes[keep] for key_codes in codes]
+    ons = stops_df['ons'].to_numpy()[keep].astype(np.int64)
+    offs = stops_df['offs'].to_numpy()[keep].astype(np.int64)
+    if len(ons) == 0:
+        index = pd.MultiIndex.from_arrays([key_uniques[:0] for key_uniques in uniques], names=keys)
+        cube = pd.DataFrame({measure: np.zeros(0, dtype=np.int64) for measure in CUBE_MEASURES}, index=index)
+        cube['boarding_rate'] = np.zeros(0)
+        return cube
+
+    # np.lexsort sorts by the last key first
+    order = np.lexsort(codes[::-1])
+    sorted_codes = [key_codes[order] for key_codes in codes]
+    changed = np.zeros(len(order), dtype=bool)
+    changed[0] = True
+    for key_codes in sorted_codes:
+        changed[1:] |= key_codes[1:] != key_codes[:-1]
+    starts = np.flatnonzero(changed)
+
+    measures = {
+        'n_stops': np.diff(np.append(starts, len(order))),
+        'boarding_stops': np.add.reduceat((ons >= 1).astype(np.int64)[order], starts),
+        'ons': np.add.reduceat(ons[order], starts),
+        'offs': np.add.reduceat(offs[order], starts),
+    }
+    index = pd.MultiIndex.from_arrays(
+        [key_uniques[key_codes[starts]] for key_codes, key_uniques in zip(sorted_codes, uniques)],
+        names=keys)
+    cube = pd.DataFrame(measures, index=index)
+    cube['boarding_rate'] = cube['boarding_stops'] / cube['n_stops']
+    return cube
+
+
+def rollup(cube, keys):
+    """Aggregate a cube up to a subset of its keys without touching stops_df"""
+    rolled = cube[CUBE_MEASURES].groupby(level=list(keys)).sum()
+    rolled['boarding_rate'] = rolled['boarding_stops'] / rolled['n_stops']
+    return rolled
+
+
+def drill_down(cube, **selection):
+    """
+    Cells of the cube matching the given key values, e.g.
+    drill_down(cube, location_id=6913). Returns an empty frame if none match.
+    """
+    keys = list(selection)
+    values = tuple(selection.values())
+    try:
+        return cube.xs(values if len(values) > 1 else values[0], level=keys if len(keys) > 1 else keys[0],
+                       drop_level=False)
+    except KeyError:
+        return cube.iloc[0:0]
@@ -0,0 +1,114 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+
+# Column order and dtypes of every exported results file; downstream readers
+# rely on these, so extend rather than rename
+RESULT_SCHEMAS = {
+    'boarding': {
+        'vehicle_id': 'int64',
+        'total_stops': 'int64',
+        'boarding_stops': 'int64',
+        'boarding_rate': 'float64',
+        'p_value': 'float64',
+    },
+    'offs_ons': {
+        'vehicle_id': 'int64',
+        'vehicle_offs': 'int64',
+        'vehicle_ons': 'int64',
+        'vehicle_total': 'int64',
+        'offs_proportion': 'float64',
+        'ons_proportion': 'float64',
+        'chi2_statistic': 'float64',
+        'p_value': 'float64',
+        'status': 'str',
+    },
+    'gps': {
+        'vehicle_id': 'int64',
+        'n_measurements': 'int64',
+        'vehicle_mean': 'float64',
+        'vehicle_std': 'float64',
+        't_statistic': 'float64',
+        'p_value': 'float64',
+    },
+}
+
+# p-value below which a vehicle counts as biased, per test
+SIGNIFICANCE = {'boarding': 0.05, 'offs_ons': 0.05, 'gps': 0.005}
+
+EXPORT_FORMATS = ('csv', 'json', 'parquet')
+
+
+def conform_to_schema(results_df, test):
+    """Select and cast the columns of a results frame to the test's schema"""
+    schema = dict(RESULT_SCHEMAS[test])
+    if 'service_date' in results_df.columns:
+        # Per-day results carry their service date in front
+        schema = {'service_date': 'datetime64[ns]', **schema}
+    return results_df.reindex(columns=list(schema)).astype(schema)
+
+
+def significant_vehicles(results_df, test, top_n=10):
+    """The top_n most significant vehicles of a results frame, by p-value"""
+    significant = results_df[results_df['p_value'] < SIGNIFICANCE[test]]
+    return significant.nsmallest(top_n, 'p_value')
+
+
+def export_bias_results(results, output_dir, formats=('csv', 'json'), top_n=10):
+    """
+    Write bias results to output_dir in bulk.
+
+    Args:
+        results (dict): Results frames keyed by name, e.g. {'boarding': df}.
+            The test is the name itself or the part after 'daily_'/'pooled_'.
+        formats (tuple): Any of 'csv', 'json' (records) and 'parquet'
+            (needs pyarrow)
+        top_n (int): Significant vehicles listed per test in summary.json
+
+    Returns:
+        dict: The summary that was written to summary.json
+    """
+    unknown = set(formats) - set(EXPORT_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown export formats {sorted(unknown)}; expected {EXPORT_FORMATS}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    summary = {}
+    for name, results_df in results.items():
+        if results_df is None:
+            continue
+        test = name.split('_', 1)[1] if name.startswith(('daily_', 'pooled_')) else name
+        results_df = conform_to_schema(results_df, test)
+
+        path = os.path.join(output_dir, name)
+        if 'csv' in formats:
+            results_df.to_csv(path + '.csv', index=False)
+        if 'json' in formats:
+            results_df.to_json(path + '.json', orient='records', date_format='iso', indent=1)
+        if 'parquet' in formats:
+            results_df.to_parquet(path + '.parquet', index=False)
+
+        top = significant_vehicles(results_df, test, top_n)
+        summary[name] = {
+            'test': test,
+            'threshold': SIGNIFICANCE[test],
+            'vehicles_tested': int(results_df['p_value'].notna().sum()),
+            'vehicles_significant': int((results_df['p_value'] < SIGNIFICANCE[test]).sum()),
+            'top_significant': json.loads(top.to_json(orient='records', date_format='iso')),
+        }
+
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as summary_file:
+        json.dump(summary, summary_file, indent=1)
+    return summary
+
+
+def print_results(results_df, formats):
+    """
+    Print selected columns of a results frame in one to_string call.
+
+    Args:
+        formats (dict): Column name -> format spec, e.g. {'p_value': '{:.4f}'}
+    """
+    formatters = {column: spec.format for column, spec in formats.items()}
+    print(results_df[list(formats)].to_string(index=False, formatters=formatters))
@@ -0,0 +1,190 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import binom, chi2, t as t_dist
+
+# Relative tolerance scipy.stats.binomtest uses when comparing pmf values
+BINOM_RERR = 1 + 1e-7
+
+
+def _binary_search_pmf(pmf, d, lo, hi):
+    """
+    Vectorized form of the binary search inside scipy.stats.binomtest.
+
+    For every element, returns i in [lo, hi] such that pmf(i) <= d < pmf(i+1),
+    where pmf(idx, mask) evaluates the (monotone) function for the elements in
+    mask. The loop mirrors scipy's step for step so the results are identical.
+    """
+    lo = lo.copy()
+    hi = hi.copy()
+    result = np.full(lo.shape, -1, dtype=np.int64)
+    active = lo < hi
+    while active.any():
+        idx = np.flatnonzero(active)
+        mid = lo[idx] + (hi[idx] - lo[idx]) // 2
+        midval = pmf(mid, idx)
+        below = midval < d[idx]
+        above = midval > d[idx]
+        equal = ~below & ~above
+        lo[idx[below]] = mid[below] + 1
+        hi[idx[above]] = mid[above] - 1
+        result[idx[equal]] = mid[equal]
+        active[idx[equal]] = False
+        active &= lo < hi
+
+    unresolved = np.flatnonzero(result < 0)
+    if len(unresolved):
+        at_lo = pmf(lo[unresolved], unresolved) <= d[unresolved]
+        result[unresolved] = np.where(at_lo, lo[unresolved], lo[unresolved] - 1)
+    return result
+
+
+def binomtest_pvalues(k, n, p):
+    """
+    Two-sided binomial test p-values for many (k, n) pairs at once.
+
+    Gives the same values as scipy.stats.binomtest(k, n, p).pvalue, computed
+    for all elements in one call.
+
+    Args:
+        k (array): Number of successes
+        n (array): Number of trials
+        p (float or array): Hypothesized probability of success
+
+    Returns:
+        ndarray: Two-sided p-values
+    """
+    k, n, p = np.broadcast_arrays(np.asarray(k, dtype=np.int64), np.asarray(n, dtype=np.int64),
+                                  np.asarray(p, dtype=float))
+    shape = k.shape
+    k, n, p = k.ravel(), n.ravel(), p.ravel()
+    d = binom.pmf(k, n, p)
+    pn = p * n
+    pvalues = np.ones(k.shape)
+
+    # k below the mean: find how far the upper tail goes with pmf <= d
+    low = np.flatnonzero(k < pn)
+    if len(low):
+        nl, pl = n[low], p[low]
+        ix = _binary_search_pmf(lambda x, i: -binom.pmf(x, nl[i], pl[i]), -d[low] * BINOM_RERR,
+                                np.ceil(pn[low]).astype(np.int64), nl.copy())
+        y = nl - ix + (d[low] * BINOM_RERR == binom.pmf(ix, nl, pl)).astype(np.int64)
+        pvalues[low] = binom.cdf(k[low], nl, pl) + binom.sf(nl - y, nl, pl)
+
+    # k above the mean: find how far the lower tail goes with pmf <= d
+    high = np.flatnonzero(k > pn)
+    if len(high):
+        nh, ph = n[high], p[high]
+        ix = _binary_search_pmf(lambda x, i: binom.pmf(x, nh[i], ph[i]), d[high] * BINOM_RERR,
+                                np.zeros(len(high), dtype=np.int64), np.floor(pn[high]).astype(np.int64))
+        y = ix + 1
+        pvalues[high] = binom.cdf(y - 1, nh, ph) + binom.sf(k[high] - 1, nh, ph)
+
+    return np.minimum(1.0, pvalues).reshape(shape)
+
+
+def chi2_contingency_2x2(table, correction=True):
+    """
+    Chi-square test of independence for a stack of 2x2 tables.
+
+    Matches scipy.stats.chi2_contingency (including its default Yates
+    continuity correction) table by table. Tables that scipy would reject
+    because an expected frequency is zero are not dropped; they get NaN
+    results and are flagged in the returned status.
+
+    Args:
+        table (array): Observed counts, shape (n_tables, 2, 2)
+
+    Returns:
+        tuple: (chi2_statistic, p_value, status) arrays of length n_tables,
+        where status is 'ok', 'no_activity' (first row all zero) or
+        'zero_expected' (some other expected frequency is zero)
+    """
+    observed = np.asarray(table, dtype=float)
+    row_sums = observed.sum(axis=2)
+    col_sums = observed.sum(axis=1)
+    total = row_sums.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = row_sums[:, :, None] * col_sums[:, None, :] / total[:, None, None]
+
+    degenerate = (expected == 0).any(axis=(1, 2)) | ~np.isfinite(expected).all(axis=(1, 2))
+    status = np.where(row_sums[:, 0] == 0, 'no_activity', np.where(degenerate, 'zero_expected', 'ok'))
+
+    if correction:
+        # Move each observed count up to 0.5 towards its expected value
+        diff = expected - observed
+        observed = observed + np.sign(diff) * np.minimum(0.5, np.abs(diff))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        statistic = ((observed - expected) ** 2 / expected).sum(axis=(1, 2))
+    statistic = np.where(degenerate, np.nan, statistic)
+    p_value = chi2.sf(statistic, 1)
+    return statistic, p_value, status
+
+
+def group_moments(keys, values):
+    """
+    Sufficient statistics of values per key in one groupby pass.
+
+    Returns:
+        DataFrame: n, mean, m2 (sum of squared deviations from the mean),
+        min and max per key, sorted by key
+    """
+    frame = pd.DataFrame({'key': np.asarray(keys), 'value': np.asarray(values, dtype=float)})
+    stats = frame.groupby('key')['value'].agg(['count', 'mean', 'var', 'min', 'max'])
+    moments = pd.DataFrame({
+        'n': stats['count'].astype(np.int64),
+        'mean': stats['mean'],
+        'm2': (stats['var'] * (stats['count'] - 1)).fillna(0.0),
+        'min': stats['min'],
+        'max': stats['max'],
+    })
+    moments.index.name = None
+    return moments
+
+
+def merge_group_moments(a, b):
+    """Combine two group_moments frames, e.g. from different chunks (Chan et al.)"""
+    if a is None or len(a) == 0:
+        return b
+    if b is None or len(b) == 0:
+        return a
+    index = a.index.union(b.index)
+    a = a.reindex(index)
+    b = b.reindex(index)
+    na = a['n'].fillna(0)
+    nb = b['n'].fillna(0)
+    n = na + nb
+    delta = b['mean'].fillna(0) - a['mean'].fillna(0)
+    return pd.DataFrame({
+        'n': n.astype(np.int64),
+        'mean': np.where(na == 0, b['mean'], np.where(nb == 0, a['mean'], a['mean'] + delta * nb / n)),
+        'm2': a['m2'].fillna(0) + b['m2'].fillna(0) + delta ** 2 * na * nb / n,
+        'min': np.fmin(a['min'], b['min']),
+        'max': np.fmax(a['max'], b['max']),
+    }, index=index)
+
+
+def pooled_moments(moments):
+    """Collapse per-group moments into a single n, mean, m2, min, max"""
+    n = moments['n'].sum()
+    mean = (moments['n'] * moments['mean']).sum() / n
+    m2 = moments['m2'].sum() + (moments['n'] * (moments['mean'] - mean) ** 2).sum()
+    return {'n': n, 'mean': mean, 'm2': m2, 'min': moments['min'].min(), 'max': moments['max'].max()}
+
+
+def ttest_1samp_from_moments(n, mean, m2, popmean):
+    """
+    One-sample two-sided t-test from sufficient statistics.
+
+    Gives the same statistic and p-value as scipy.stats.ttest_1samp on the
+    underlying samples, without needing the samples themselves.
+
+    Returns:
+        tuple: (t_statistic, p_value) arrays
+    """
+    n = np.asarray(n, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        standard_error = np.sqrt(np.asarray(m2, dtype=float) / (n - 1) / n)
+        t_statistic = (np.asarray(mean, dtype=float) - popmean) / standard_error
+    p_value = 2 * t_dist.sf(np.abs(t_statistic), n - 1)
+    return t_statistic, p_value
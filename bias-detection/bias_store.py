@@ -0,0 +1,184 @@
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import os
+import time
+from bias import (day_vehicle_counts, aggregate_gps_data, boarding_bias_table,
+                  offs_ons_bias_table, gps_bias_table)
+from bias_stats import merge_group_moments
+from stop_events import file_fingerprint, service_date_from_path
+
+# Per-vehicle sufficient statistics kept in the store
+COUNT_COLUMNS = ['n_stops', 'boarding_stops', 'ons', 'offs']
+MOMENT_COLUMNS = ['n', 'mean', 'm2', 'min', 'max']
+
+
+class BiasStore:
+    """
+    Persisted per-vehicle sufficient statistics for incremental bias monitoring.
+
+    Each day's stop-event counts and RELPOS moments are merged in once (the
+    store records which sources it has seen), and the binomial, chi-square
+    and t-tests are re-evaluated from the stored totals without touching the
+    raw files again.
+
+    Layout of the store directory:
+        stop_counts.csv    n_stops, boarding_stops, ons, offs per vehicle
+        relpos_moments.csv n, mean, m2, min, max of RELPOS per vehicle
+        sources.json       sources already merged, keyed by kind and date
+    """
+
+    def __init__(self, path='bias_store'):
+        self.path = path
+        self.stop_counts = pd.DataFrame(columns=COUNT_COLUMNS, dtype=np.int64)
+        self.stop_counts.index.name = 'vehicle_number'
+        self.relpos_moments = None
+        self.sources = {}
+        if os.path.exists(os.path.join(path, 'sources.json')):
+            self.load()
+
+    def load(self):
+        with open(os.path.join(self.path, 'sources.json')) as sources_file:
+            self.sources = json.load(sources_file)
+        counts_path = os.path.join(self.path, 'stop_counts.csv')
+        if os.path.exists(counts_path):
+            self.stop_counts = pd.read_csv(counts_path, index_col='vehicle_number')
+        moments_path = os.path.join(self.path, 'relpos_moments.csv')
+        if os.path.exists(moments_path):
+            self.relpos_moments = pd.read_csv(moments_path, index_col=0)
+            self.relpos_moments.index.name = None
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        # Statistics first, sources last: a crash in between leaves a store
+        # that re-ingests the day instead of one that skips it
+        _write_atomic(os.path.join(self.path, 'stop_counts.csv'),
+                      lambda f: self.stop_counts.to_csv(f))
+        if self.relpos_moments is not None:
+            _write_atomic(os.path.join(self.path, 'relpos_moments.csv'),
+                          lambda f: self.relpos_moments.to_csv(f))
+        _write_atomic(os.path.join(self.path, 'sources.json'),
+                      lambda f: json.dump(self.sources, f, indent=1, sort_keys=True))
+
+    def has_source(self, kind, digest):
+        """Whether a source with this content digest has been merged already"""
+        return any(source.get('digest') == digest for source in self.sources.get(kind, {}).values())
+
+    def _is_new_source(self, kind, day, source):
+        """
+        False if the source's content was merged before (under any day). A day
+        that was merged from different content raises: the store only holds
+        totals, so the old day cannot be taken out again.
+        """
+        digest = (source or {}).get('digest')
+        if digest is not None and self.has_source(kind, digest):
+            return False
+        known = self.sources.get(kind, {}).get(day)
+        if known is not None:
+            if digest is None or known.get('digest') is None:
+                return False
+            raise ValueError(f"{kind} for {day} were already merged from {known.get('file')} "
+                             f"(digest {known['digest']}); {(source or {}).get('file')} has different "
+                             f"content. Rebuild the store to replace that day.")
+        return True
+
+    def merge_stop_counts(self, day, counts, source=None):
+        """Merge one day's vehicle_stop_counts() frame; returns False if already merged"""
+        if not self._is_new_source('stop_events', day, source):
+            return False
+        self.stop_counts = (pd.concat([self.stop_counts, counts[COUNT_COLUMNS]])
+                            .groupby(level=0).sum().astype(np.int64))
+        self.stop_counts.index.name = 'vehicle_number'
+        self.sources.setdefault('stop_events', {})[day] = source or {}
+        return True
+
+    def merge_relpos_moments(self, day, moments, source=None):
+        """Merge one day's RELPOS group moments; returns False if already merged"""
+        if not self._is_new_source('gps', day, source):
+            return False
+        self.relpos_moments = merge_group_moments(self.relpos_moments, moments[MOMENT_COLUMNS])
+        self.sources.setdefault('gps', {})[day] = source or {}
+        return True
+
+    def ingest_stop_event_file(self, html_file_path):
+        service_date = service_date_from_path(html_file_path, default=None)
+        if service_date is None:
+            raise ValueError(f"No service date in the file name {html_file_path}")
+        day = f"{service_date:%Y-%m-%d}"
+        source = {'file': os.path.basename(html_file_path), 'digest': file_fingerprint(html_file_path)}
+        if not self._is_new_source('stop_events', day, source):
+            print(f"  {day}: {source['file']} already in store, skipped")
+            return False
+        counts = day_vehicle_counts(html_file_path)
+        self.merge_stop_counts(day, counts, source)
+        print(f"  {day}: merged {counts['n_stops'].sum()} stop events for {len(counts)} vehicles")
+        return True
+
+    def ingest_gps_file(self, csv_file_path, day):
+        if not os.path.exists(csv_file_path):
+            print(f"  {csv_file_path} not found, skipped")
+            return False
+        source = {'file': os.path.basename(csv_file_path), 'digest': file_fingerprint(csv_file_path)}
+        if not self._is_new_source('gps', day, source):
+            print(f"  {day}: {source['file']} already in store, skipped")
+            return False
+        moments = aggregate_gps_data(csv_file_path)
+        if moments is None:
+            return False
+        self.merge_relpos_moments(day, moments, source)
+        print(f"  {day}: merged {moments['n'].sum()} RELPOS measurements for {len(moments)} vehicles")
+        return True
+
+    def evaluate(self):
+        """Re-run all three bias tests from the stored statistics"""
+        results = {}
+        if len(self.stop_counts) > 0:
+            results['boarding'] = boarding_bias_table(self.stop_counts)
+            results['offs_ons'] = offs_ons_bias_table(self.stop_counts)
+        if self.relpos_moments is not None and len(self.relpos_moments) > 0:
+            results['gps'] = gps_bias_table(self.relpos_moments)
+        return results
+
+
+def _write_atomic(path, write):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='') as tmp_file:
+        write(tmp_file)
+    os.replace(tmp_path, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs='*', help="stop event files to merge into the store")
+    parser.add_argument("-s", "--store", default='bias_store')
+    parser.add_argument("-g", "--gps", help="GPS CSV to merge into the store")
+    parser.add_argument("--gps-date", help="service date of the GPS CSV (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    store = BiasStore(args.store)
+    print(f"Bias store {args.store}: {len(store.sources.get('stop_events', {}))} days of stop events, "
+          f"{len(store.sources.get('gps', {}))} days of GPS data")
+
+    gps_date = args.gps_date
+    if args.gps and gps_date is None:
+        service_date = service_date_from_path(args.gps, default=None)
+        if service_date is None:
+            parser.error(f"{args.gps} has no date in its name; pass --gps-date")
+        gps_date = f"{service_date:%Y-%m-%d}"
+
+    for path in args.files:
+        store.ingest_stop_event_file(path)
+    if args.gps:
+        store.ingest_gps_file(args.gps, gps_date)
+    store.save()
+    print()
+
+    start = time.perf_counter()
+    results = store.evaluate()
+    elapsed = time.perf_counter() - start
+    print(f"Bias tests evaluated from the store in {elapsed * 1000:.1f} ms")
+    thresholds = {'boarding': 0.05, 'offs_ons': 0.05, 'gps': 0.005}
+    for name, results_df in results.items():
+        significant = (results_df['p_value'] < thresholds[name]).sum()
+        print(f"  {name}: {len(results_df)} vehicles tested, {significant} significant (p < {thresholds[name]})")
@@ -0,0 +1,167 @@
+import pandas as pd
+import numpy as np
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from bias import process_trimet_data
+
+# Upper bound on the size of one batch's (resamples x units) index matrix
+BATCH_ELEMENTS = 4_000_000
+# Slack when comparing resampled statistics with the observed one
+STAT_TOLERANCE = 1e-12
+
+
+def resampling_units(stops_df, unit='trip_id'):
+    """
+    Collapse stop events into the units that get resampled.
+
+    Stop events of one trip are not independent, so by default whole trips
+    are resampled; unit=None resamples individual stop events instead.
+
+    Returns:
+        DataFrame: vehicle_number, n_stops, boarding_stops, ons, offs per unit,
+        sorted by vehicle_number
+    """
+    events = pd.DataFrame({
+        'vehicle_number': stops_df['vehicle_number'].to_numpy(),
+        'n_stops': 1,
+        'boarding_stops': (stops_df['ons'] >= 1).to_numpy().astype(np.int64),
+        'ons': stops_df['ons'].to_numpy().astype(np.int64),
+        'offs': stops_df['offs'].to_numpy().astype(np.int64),
+    })
+    if unit is None:
+        return events.sort_values('vehicle_number', kind='stable').reset_index(drop=True)
+    events['unit'] = stops_df[unit].to_numpy()
+    return events.groupby(['vehicle_number', 'unit'], sort=True).sum().reset_index(level='vehicle_number').reset_index(drop=True)
+
+
+def _vehicle_sums(values, resampled_units, starts):
+    # Sum the resampled units of each vehicle: (resamples, units) -> (resamples, vehicles)
+    return np.add.reduceat(values[resampled_units], starts, axis=1)
+
+
+def _resample_batch(units, starts, sizes, seed, n_resamples):
+    """
+    One batch of permutations and bootstrap resamples for every vehicle.
+
+    Returns:
+        dict: exceedance counts of the permutation tests and the bootstrap
+        boarding rates and offs proportions, shape (n_resamples, vehicles)
+    """
+    rng = np.random.default_rng(seed)
+    n_units = len(units['n_stops'])
+    n_stops = units['n_stops']
+    boarding = units['boarding_stops']
+    offs = units['offs']
+    activity = units['offs'] + units['ons']
+
+    observed_rate = np.add.reduceat(boarding, starts) / np.add.reduceat(n_stops, starts)
+    system_rate = boarding.sum() / n_stops.sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        observed_offs = np.add.reduceat(offs, starts) / np.add.reduceat(activity, starts)
+        system_offs = offs.sum() / activity.sum()
+
+        # Permutation: shuffle which vehicle every unit belongs to
+        permuted = rng.permuted(np.broadcast_to(np.arange(n_units), (n_resamples, n_units)), axis=1)
+        rate = _vehicle_sums(boarding, permuted, starts) / _vehicle_sums(n_stops, permuted, starts)
+        offs_prop = _vehicle_sums(offs, permuted, starts) / _vehicle_sums(activity, permuted, starts)
+        boarding_exceed = (np.abs(rate - system_rate)
+                           >= np.abs(observed_rate - system_rate) - STAT_TOLERANCE).sum(axis=0)
+        offs_exceed = (np.abs(offs_prop - system_offs)
+                       >= np.abs(observed_offs - system_offs) - STAT_TOLERANCE).sum(axis=0)
+
+        # Bootstrap: redraw each vehicle's own units with replacement
+        slot_start = np.repeat(starts, sizes)
+        slot_size = np.repeat(sizes, sizes)
+        drawn = slot_start + (rng.random((n_resamples, n_units)) * slot_size).astype(np.int64)
+        boot_rate = _vehicle_sums(boarding, drawn, starts) / _vehicle_sums(n_stops, drawn, starts)
+        boot_offs = _vehicle_sums(offs, drawn, starts) / _vehicle_sums(activity, drawn, starts)
+
+    return {
+        'boarding_exceed': boarding_exceed,
+        'offs_exceed': offs_exceed,
+        'boot_rate': boot_rate.astype(np.float32),
+        'boot_offs': boot_offs.astype(np.float32),
+    }
+
+
+def resample_bias(stops_df, n_resamples=10_000, unit='trip_id', seed=0, processes=1,
+                  confidence_level=0.95):
+    """
+    Resampling-based boarding-rate and offs/ons bias for every vehicle.
+
+    Permutation p-values test each vehicle against the system-wide rate and
+    proportion; bootstrap percentile intervals give their uncertainty. The
+    resamples are generated as index matrices in batches that evaluate all
+    vehicles at once. Each batch has its own seed spawned from `seed`, so the
+    results do not depend on the number of processes.
+
+    Returns:
+        DataFrame: per-vehicle estimates, p-values and confidence intervals
+    """
+    units_df = resampling_units(stops_df, unit)
+    vehicles, starts, sizes = np.unique(units_df['vehicle_number'].to_numpy(),
+                                        return_index=True, return_counts=True)
+    units = {column: units_df[column].to_numpy() for column in ['n_stops', 'boarding_stops', 'ons', 'offs']}
+
+    batch_size = max(1, min(n_resamples, BATCH_ELEMENTS // max(1, len(units_df))))
+    batch_sizes = [batch_size] * (n_resamples // batch_size)
+    if n_resamples % batch_size:
+        batch_sizes.append(n_resamples % batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+
+    if processes == 1:
+        batches = [_resample_batch(units, starts, sizes, s, n) for s, n in zip(seeds, batch_sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(_resample_batch, units, starts, sizes, s, n)
+                       for s, n in zip(seeds, batch_sizes)]
+            batches = [future.result() for future in futures]
+
+    boarding_exceed = sum(batch['boarding_exceed'] for batch in batches)
+    offs_exceed = sum(batch['offs_exceed'] for batch in batches)
+    boot_rate = np.concatenate([batch['boot_rate'] for batch in batches])
+    boot_offs = np.concatenate([batch['boot_offs'] for batch in batches])
+    tail = (1 - confidence_level) / 2
+
+    n_stops = np.add.reduceat(units['n_stops'], starts)
+    boarding_stops = np.add.reduceat(units['boarding_stops'], starts)
+    vehicle_offs = np.add.reduceat(units['offs'], starts)
+    vehicle_total = vehicle_offs + np.add.reduceat(units['ons'], starts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        offs_proportion = vehicle_offs / vehicle_total
+        rate_ci = np.nanquantile(boot_rate, [tail, 1 - tail], axis=0)
+        offs_ci = np.nanquantile(boot_offs, [tail, 1 - tail], axis=0)
+
+    return pd.DataFrame({
+        'vehicle_id': vehicles,
+        'n_units': sizes,
+        'total_stops': n_stops,
+        'boarding_rate': boarding_stops / n_stops,
+        'boarding_ci_low': rate_ci[0],
+        'boarding_ci_high': rate_ci[1],
+        'boarding_p_value': (1 + boarding_exceed) / (1 + n_resamples),
+        'offs_proportion': offs_proportion,
+        'offs_ci_low': offs_ci[0],
+        'offs_ci_high': offs_ci[1],
+        'offs_ons_p_value': np.where(vehicle_total > 0, (1 + offs_exceed) / (1 + n_resamples), np.nan),
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--file", default='trimet_stopevents_2022-12-07.html')
+    parser.add_argument("-n", "--resamples", type=int, default=10_000)
+    parser.add_argument("-u", "--unit", default='trip_id', help="resampling unit column, or 'event'")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-p", "--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    stops_df = process_trimet_data(args.file)
+    results_df = resample_bias(stops_df, args.resamples, None if args.unit == 'event' else args.unit,
+                               args.seed, args.processes)
+
+    print(f"Resampling Bias Analysis ({args.resamples} resamples by {args.unit})")
+    print(results_df.round(4).to_string(index=False))
+    print()
+    print(f"Vehicles with significant boarding bias (p < 0.05): {(results_df['boarding_p_value'] < 0.05).sum()}")
+    print(f"Vehicles with significant offs/ons bias (p < 0.05): {(results_df['offs_ons_p_value'] < 0.05).sum()}")
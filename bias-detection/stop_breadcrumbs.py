@@ -0,0 +1,101 @@
+import pandas as pd
+import numpy as np
+import argparse
+from bias import process_trimet_data
+
+# Breadcrumb columns needed for the join
+BREADCRUMB_COLUMNS = ['EVENT_NO_TRIP', 'OPD_DATE', 'VEHICLE_ID', 'METERS', 'ACT_TIME',
+                      'GPS_LONGITUDE', 'GPS_LATITUDE']
+# Stop events further than this from any breadcrumb of their vehicle stay unmatched
+MATCH_TOLERANCE = pd.Timedelta(seconds=120)
+
+
+def load_breadcrumbs(csv_file_path):
+    """
+    Read breadcrumbs and derive per-reading motion features in vectorized form.
+
+    Within each vehicle, readings are ordered by time. SPEED is computed as in
+    transport/enhance.py. Consecutive readings with an unchanged odometer
+    (METERS) form one position run: the vehicle was standing still there. Each
+    reading carries the dwell time of its run and the approach speed, i.e. the
+    speed on the reading that arrived at that position.
+    """
+    df = pd.read_csv(csv_file_path, usecols=BREADCRUMB_COLUMNS)
+    base = pd.to_datetime(df['OPD_DATE'], format='%d%b%Y:%H:%M:%S')
+    df['TIMESTAMP'] = (base + pd.to_timedelta(df['ACT_TIME'], unit='s')).astype('datetime64[ns]')
+    df['VEHICLE_ID'] = df['VEHICLE_ID'].astype(np.int64)
+    df = df.drop(columns=['OPD_DATE', 'ACT_TIME']).sort_values(['VEHICLE_ID', 'TIMESTAMP'], kind='stable')
+    df = df.reset_index(drop=True)
+
+    vehicle = df['VEHICLE_ID'].to_numpy()
+    meters = df['METERS'].to_numpy(dtype=float)
+    seconds = (df['TIMESTAMP'] - df['TIMESTAMP'].min()).dt.total_seconds().to_numpy()
+
+    new_vehicle = np.r_[True, vehicle[1:] != vehicle[:-1]]
+    d_meters = np.where(new_vehicle, np.nan, np.r_[np.nan, np.diff(meters)])
+    d_seconds = np.where(new_vehicle, np.nan, np.r_[np.nan, np.diff(seconds)])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['SPEED'] = np.where(d_seconds > 0, d_meters / d_seconds, 0.0)
+
+    # A position run starts with a new vehicle or whenever the odometer moves
+    run_start = new_vehicle | (d_meters != 0)
+    run_id = np.cumsum(run_start) - 1
+    starts = np.flatnonzero(run_start)
+    ends = np.r_[starts[1:], len(df)] - 1
+    df['dwell_seconds'] = (seconds[ends] - seconds[starts])[run_id]
+    df['approach_speed'] = df['SPEED'].to_numpy()[starts][run_id]
+    return df
+
+
+def join_stops_breadcrumbs(stops_df, breadcrumbs_df, tolerance=MATCH_TOLERANCE):
+    """
+    Match every stop event to its vehicle's nearest breadcrumb in time.
+
+    Uses a sorted as-of join partitioned by vehicle, so a full fleet-day is
+    matched in one pass.
+
+    Returns:
+        DataFrame: stop events with the matched breadcrumb's time offset,
+        position, speed, dwell_seconds and approach_speed (NaN when unmatched),
+        in the row order and with the index of stops_df
+    """
+    stops = stops_df.assign(
+        vehicle_number=stops_df['vehicle_number'].astype(np.int64),
+        tstamp=stops_df['tstamp'].astype('datetime64[ns]'),
+        # merge_asof needs rows sorted by time; this restores the input order
+        input_position=np.arange(len(stops_df)),
+    ).sort_values('tstamp', kind='stable')
+    crumbs = breadcrumbs_df[['VEHICLE_ID', 'TIMESTAMP', 'GPS_LONGITUDE', 'GPS_LATITUDE',
+                             'SPEED', 'dwell_seconds', 'approach_speed']].sort_values('TIMESTAMP', kind='stable')
+
+    joined = pd.merge_asof(stops, crumbs, left_on='tstamp', right_on='TIMESTAMP',
+                           left_by='vehicle_number', right_by='VEHICLE_ID',
+                           direction='nearest', tolerance=tolerance)
+    joined['breadcrumb_offset_s'] = (joined['TIMESTAMP'] - joined['tstamp']).dt.total_seconds()
+    joined = joined.sort_values('input_position').drop(columns=['VEHICLE_ID', 'input_position'])
+    joined.index = stops_df.index
+    return joined.rename(columns={'TIMESTAMP': 'breadcrumb_time'})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--stops", default='trimet_stopevents_2022-12-07.html')
+    parser.add_argument("-b", "--breadcrumbs", required=True)
+    parser.add_argument("-t", "--tolerance", type=int, default=120, help="seconds")
+    args = parser.parse_args()
+
+    stops_df = process_trimet_data(args.stops)
+    breadcrumbs_df = load_breadcrumbs(args.breadcrumbs)
+    joined = join_stops_breadcrumbs(stops_df, breadcrumbs_df, pd.Timedelta(seconds=args.tolerance))
+
+    matched = joined['breadcrumb_time'].notna()
+    print(f"Stop events: {len(joined)}, matched to a breadcrumb: {matched.sum()}")
+    print()
+    print("Per-vehicle dwell and approach speed (matched stop events):")
+    summary = joined[matched].groupby('vehicle_number').agg(
+        stops=('tstamp', 'size'),
+        mean_dwell_s=('dwell_seconds', 'mean'),
+        mean_approach_speed=('approach_speed', 'mean'),
+        mean_abs_offset_s=('breadcrumb_offset_s', lambda offset: offset.abs().mean()),
+    )
+    print(summary.round(2))
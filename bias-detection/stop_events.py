@@ -0,0 +1,370 @@
+import pandas as pd
+import numpy as np
+from array import array
+from datetime import datetime
+import re
+import os
+import mmap
+import bisect
+import codecs
+import gzip
+import io
+import itertools
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+# Each trip's table is introduced by a header naming the trip
+TRIP_HEADER_PATTERN = r'<h2>Stop events for PDX_TRIP\s+([^<]+)</h2>'
+# A stop event row has 24 cells
+ROW_PATTERN = r'<tr>' + r'<td>([^<]+)</td>' * 24 + r'</tr>'
+
+# Trip headers and rows in document order; group 1 is set only for headers
+TOKEN_RE = re.compile(f'{TRIP_HEADER_PATTERN}|{ROW_PATTERN}')
+# Literal prefix of a trip header, used to find split points in the raw bytes
+TRIP_HEADER_BYTES = b'<h2>Stop events for PDX_TRIP'
+
+INT32 = np.iinfo(np.int32)
+INT16 = np.iinfo(np.int16)
+
+# Default number of characters read from the file per block
+BLOCK_SIZE = 1 << 20
+
+# Bump whenever the parser output changes so cached frames are rebuilt
+PARSER_VERSION = 2
+CACHE_DIR = '.stop_event_cache'
+
+# Leading bytes of the compressed formats accepted as input
+COMPRESSION_MAGIC = {b'\x1f\x8b': 'gzip', b'\x28\xb5\x2f\xfd': 'zstd'}
+
+# Service date used when the file name does not carry one
+DEFAULT_SERVICE_DATE = datetime(2022, 12, 7)
+SERVICE_DATE_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+
+
+def iter_trip_rows(html_file_path, block_size=BLOCK_SIZE):
+    """
+    Scan a TriMet stop-event HTML file block by block.
+
+    Only the current block and the current trip's rows are held in memory,
+    so memory stays flat however large the file is.
+
+    Yields:
+        tuple: (trip_id, rows) where each row is the tuple of 24 cell strings
+    """
+    with open_stop_event_text(html_file_path) as file:
+        yield from scan_trip_blocks(iter(lambda: file.read(block_size), ''))
+
+
+def detect_compression(html_file_path):
+    """'gzip', 'zstd' or None, from the file's leading bytes rather than its name"""
+    with open(html_file_path, 'rb') as file:
+        head = file.read(4)
+    for magic, compression in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def open_stop_event_text(html_file_path):
+    """
+    Open a stop-event file as UTF-8 text, decompressing gzip and zstd input
+    on the fly so compressed archives never have to be expanded on disk.
+    """
+    compression = detect_compression(html_file_path)
+    if compression == 'gzip':
+        return gzip.open(html_file_path, 'rt', encoding='utf-8')
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(f"{html_file_path} is zstd-compressed; install the zstandard package to read it")
+        # Multi-frame archives (pzstd output, concatenated files) must be read to the end
+        raw = zstandard.ZstdDecompressor().stream_reader(open(html_file_path, 'rb'), closefd=True,
+                                                          read_across_frames=True)
+        return io.TextIOWrapper(io.BufferedReader(raw), encoding='utf-8')
+    return open(html_file_path, 'r', encoding='utf-8')
+
+
+def scan_trip_blocks(blocks):
+    """Yield (trip_id, rows) from an iterable of consecutive text blocks"""
+    trip_id = None
+    rows = []
+    buffer = ''
+    for block in itertools.chain(blocks, ['']):
+        buffer += block
+        if block:
+            # Only scan up to the last complete header or row; the tail
+            # is kept and completed by the next block
+            cut = max(buffer.rfind('</tr>'), buffer.rfind('</h2>'))
+            if cut < 0:
+                continue
+            cut += len('</tr>')
+        else:
+            cut = len(buffer)
+
+        for match in TOKEN_RE.finditer(buffer, 0, cut):
+            if match.group(1) is not None:
+                if trip_id is not None:
+                    yield trip_id, rows
+                trip_id = match.group(1).strip()
+                rows = []
+            elif trip_id is not None:
+                # Rows before the first trip header belong to no trip
+                rows.append(match.groups()[1:])
+
+        buffer = buffer[cut:]
+
+    if trip_id is not None:
+        yield trip_id, rows
+
+
+def find_trip_offsets(html_file_path):
+    """Byte offsets of every trip header in the file"""
+    offsets = []
+    with open(html_file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return offsets
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            position = data.find(TRIP_HEADER_BYTES)
+            while position >= 0:
+                offsets.append(position)
+                position = data.find(TRIP_HEADER_BYTES, position + 1)
+    return offsets
+
+
+def split_byte_ranges(html_file_path, n_ranges):
+    """
+    Split the file into at most n_ranges byte ranges of similar size.
+
+    Every range starts at a trip header, so each one holds whole trips.
+    """
+    offsets = find_trip_offsets(html_file_path)
+    if not offsets:
+        return []
+    size = os.path.getsize(html_file_path)
+    starts = {offsets[0]}
+    for i in range(1, n_ranges):
+        k = bisect.bisect_left(offsets, size * i // n_ranges)
+        if k < len(offsets):
+            starts.add(offsets[k])
+    starts = sorted(starts)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def parse_byte_range(html_file_path, start, end, block_size=BLOCK_SIZE):
+    """Parse the trips in bytes [start, end) of the file into StopEventColumns"""
+    def blocks():
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        with open(html_file_path, 'rb') as file:
+            file.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                data = file.read(min(block_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield decoder.decode(data)
+            yield decoder.decode(b'', final=True)
+
+    columns = StopEventColumns()
+    for trip_id, rows in scan_trip_blocks(blocks()):
+        columns.add_trip(trip_id, rows)
+    return columns
+
+
+class StopEventColumns:
+    """
+    Column-wise builder for parsed stop events.
+
+    Values go straight into typed arrays; the frame, including the tstamp
+    column, is only assembled once in to_frame().
+    """
+
+    def __init__(self):
+        self.trip_ids = []
+        self.trip_counts = array('q')
+        self.vehicle_number = array('i')
+        self.location_id = array('i')
+        self.ons = array('h')
+        self.offs = array('h')
+        self.arrive_time = array('q')
+
+    def add_trip(self, trip_id, rows):
+        count = 0
+        for match in rows:
+            try:
+                vehicle_number = int(match[0])
+                arrive_time = int(match[8])
+                location_id = int(match[10])
+                ons = int(match[13])
+                offs = int(match[14])
+                # Check the ranges up front so a bad row never leaves the
+                # columns with different lengths
+                if not (_in_range(vehicle_number, INT32) and _in_range(location_id, INT32)
+                        and _in_range(ons, INT16) and _in_range(offs, INT16)):
+                    continue
+            except (ValueError, IndexError):
+                continue
+            self.vehicle_number.append(vehicle_number)
+            self.arrive_time.append(arrive_time)
+            self.location_id.append(location_id)
+            self.ons.append(ons)
+            self.offs.append(offs)
+            count += 1
+        if count:
+            self.trip_ids.append(trip_id)
+            self.trip_counts.append(count)
+
+    def extend(self, other):
+        """Append the stop events of another builder after this one's"""
+        self.trip_ids.extend(other.trip_ids)
+        self.trip_counts.extend(other.trip_counts)
+        self.vehicle_number.extend(other.vehicle_number)
+        self.location_id.extend(other.location_id)
+        self.ons.extend(other.ons)
+        self.offs.extend(other.offs)
+        self.arrive_time.extend(other.arrive_time)
+        return self
+
+    def __len__(self):
+        return len(self.arrive_time)
+
+    def to_frame(self, base_date=DEFAULT_SERVICE_DATE):
+        arrive_time = np.frombuffer(self.arrive_time, dtype=np.int64)
+        trip_id = np.repeat(np.array(self.trip_ids, dtype=object),
+                            np.frombuffer(self.trip_counts, dtype=np.int64))
+        return pd.DataFrame({
+            'trip_id': trip_id,
+            'vehicle_number': np.frombuffer(self.vehicle_number, dtype=np.int32),
+            'tstamp': pd.Timestamp(base_date) + pd.to_timedelta(arrive_time, unit='s'),
+            'location_id': np.frombuffer(self.location_id, dtype=np.int32),
+            'ons': np.frombuffer(self.ons, dtype=np.int16),
+            'offs': np.frombuffer(self.offs, dtype=np.int16),
+        })
+
+
+def _in_range(value, info):
+    return info.min <= value <= info.max
+
+
+def service_date_from_path(html_file_path, default=DEFAULT_SERVICE_DATE):
+    """Service date from a name like trimet_stopevents_2022-12-07.html, else default"""
+    match = SERVICE_DATE_RE.search(os.path.basename(html_file_path))
+    if match is None:
+        return default
+    return datetime(*(int(part) for part in match.groups()))
+
+
+def parse_stop_events(html_file_path, block_size=BLOCK_SIZE, processes=1):
+    """
+    Parse a stop-event HTML file into the stop_events frame.
+
+    Arrive times are offsets from the service date in the file name.
+
+    With processes other than 1 the file is split at trip headers into byte
+    ranges that are parsed in a process pool (None uses every CPU); the
+    ranges are concatenated in file order, so the frame is the same either way.
+    Compressed files cannot be split at byte offsets and are always streamed
+    through a single parser.
+    """
+    if processes == 1 or detect_compression(html_file_path) is not None:
+        columns = StopEventColumns()
+        for trip_id, rows in iter_trip_rows(html_file_path, block_size):
+            columns.add_trip(trip_id, rows)
+        return columns.to_frame(service_date_from_path(html_file_path))
+
+    workers = processes or os.cpu_count()
+    # Several ranges per worker keep the pool busy when trips vary in size
+    ranges = split_byte_ranges(html_file_path, workers * 4)
+    columns = StopEventColumns()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(parse_byte_range, html_file_path, start, end, block_size)
+                   for start, end in ranges]
+        for future in futures:
+            columns.extend(future.result())
+    return columns.to_frame(service_date_from_path(html_file_path))
+
+
+def file_fingerprint(file_path, cache_dir=CACHE_DIR):
+    """
+    Content hash (BLAKE2b) of a source file.
+
+    The digest is remembered together with the file's size and mtime, so an
+    unchanged file is not re-hashed on every run.
+    """
+    stat = os.stat(file_path)
+    memo_path = os.path.join(cache_dir, os.path.basename(file_path) + '.fingerprint.json')
+    if os.path.exists(memo_path):
+        with open(memo_path) as memo_file:
+            memo = json.load(memo_file)
+        if (memo.get('path') == os.path.abspath(file_path) and memo.get('size') == stat.st_size
+                and memo.get('mtime_ns') == stat.st_mtime_ns):
+            return memo['digest']
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as file:
+        for data in iter(lambda: file.read(BLOCK_SIZE * 8), b''):
+            digest.update(data)
+    digest = digest.hexdigest()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(memo_path, 'w') as memo_file:
+        json.dump({'path': os.path.abspath(file_path), 'size': stat.st_size,
+                   'mtime_ns': stat.st_mtime_ns, 'digest': digest}, memo_file)
+    return digest
+
+
+def save_stop_events(stops_df, cache_path):
+    """Write the stop_events frame column by column to an .npz file"""
+    trip_codes, trip_ids = pd.factorize(stops_df['trip_id'])
+    tmp_path = cache_path + '.tmp.npz'
+    np.savez(tmp_path,
+             trip_codes=trip_codes.astype(np.int32),
+             trip_ids=np.asarray(trip_ids, dtype=str),
+             vehicle_number=stops_df['vehicle_number'].to_numpy(),
+             tstamp=stops_df['tstamp'].to_numpy(),
+             location_id=stops_df['location_id'].to_numpy(),
+             ons=stops_df['ons'].to_numpy(),
+             offs=stops_df['offs'].to_numpy())
+    # Rename at the end so a crashed run never leaves half a cache behind
+    os.replace(tmp_path, cache_path)
+
+
+def read_stop_events(cache_path):
+    with np.load(cache_path) as data:
+        trip_ids = data['trip_ids'].astype(object)
+        return pd.DataFrame({
+            'trip_id': trip_ids[data['trip_codes']] if len(trip_ids) else np.array([], dtype=object),
+            'vehicle_number': data['vehicle_number'],
+            'tstamp': data['tstamp'],
+            'location_id': data['location_id'],
+            'ons': data['ons'],
+            'offs': data['offs'],
+        })
+
+
+def load_stop_events(html_file_path, cache_dir=CACHE_DIR, block_size=BLOCK_SIZE, processes=1):
+    """
+    Parsed stop_events frame, served from cache_dir when possible.
+
+    The cache entry is keyed by the source file's content hash and
+    PARSER_VERSION, so editing the file or the parser triggers a re-parse.
+    Entries for older versions of the same file are removed.
+    """
+    if cache_dir is None:
+        return parse_stop_events(html_file_path, block_size, processes)
+
+    name = os.path.basename(html_file_path)
+    digest = file_fingerprint(html_file_path, cache_dir)
+    cache_path = os.path.join(cache_dir, f'{name}.{digest}.v{PARSER_VERSION}.npz')
+    if os.path.exists(cache_path):
+        return read_stop_events(cache_path)
+
+    stops_df = parse_stop_events(html_file_path, block_size, processes)
+    for stale in os.listdir(cache_dir):
+        # <name>.<digest>.v<version>.npz only, so x.html never claims x.html.gz entries
+        if stale.startswith(name + '.') and stale.endswith('.npz') and stale[len(name):].count('.') == 3:
+            os.remove(os.path.join(cache_dir, stale))
+    save_stop_events(stops_df, cache_path)
+    return stops_df
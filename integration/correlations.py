@@ -0,0 +1,247 @@
+import pandas as pd
+import numpy as np
+import argparse
+import logging
+from scipy import special, stats
+from integrated_dataset import load_join_df
+
+logger = logging.getLogger(__name__)
+
+CORRELATION_METHODS = ('pearson', 'spearman', 'kendall')
+# Upper bound on the size of one tile of Kendall pair signs (rows x rows x columns)
+BLOCK_ELEMENTS = 4_000_000
+
+
+def _pearson_complete(X):
+    """Pearson matrix of the columns of a NaN-free 2-D array"""
+    centered = X - X.mean(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalized = centered / np.sqrt((centered ** 2).sum(axis=0))
+    return np.clip(normalized.T @ normalized, -1.0, 1.0)
+
+
+def _spearman_complete(X):
+    """Spearman matrix: Pearson on the columns' average ranks"""
+    return _pearson_complete(stats.rankdata(X, axis=0))
+
+
+def _kendall_complete(X):
+    """
+    Kendall tau-b matrix of the columns of a NaN-free 2-D array.
+
+    For every row pair (i, j > i) the signs of the column differences form
+    one row of a sign matrix S; S.T @ S sums concordant minus discordant
+    pairs for all column pairs at once. S is built one tile of rows i by
+    rows j at a time so it never holds more than BLOCK_ELEMENTS values
+    (or a single row pair when there are more columns than that).
+    """
+    n_rows, n_columns = X.shape
+    concordance = np.zeros((n_columns, n_columns))
+    untied = np.zeros(n_columns)
+    tile = max(1, int(np.sqrt(BLOCK_ELEMENTS // max(1, n_columns))))
+    positions = np.arange(n_rows)
+    for start in range(0, n_rows - 1, tile):
+        rows = positions[start:start + tile]
+        for other_start in range(start + 1, n_rows, tile):
+            others = positions[other_start:other_start + tile]
+            # Signs are exact in float32, which halves the memory and BLAS work
+            signs = np.sign(X[None, others, :] - X[rows, None, :]).astype(np.float32)
+            # Keep only pairs with j > i so each pair is counted once
+            signs *= (others[None, :] > rows[:, None])[:, :, None]
+            signs = signs.reshape(-1, n_columns)
+            concordance += signs.T @ signs
+            untied += np.count_nonzero(signs, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.clip(concordance / np.sqrt(np.outer(untied, untied)), -1.0, 1.0)
+
+
+_COMPLETE_CORRELATIONS = {
+    'pearson': _pearson_complete,
+    'spearman': _spearman_complete,
+    'kendall': _kendall_complete,
+}
+
+
+def _tie_sums(X):
+    """
+    Per-column tie statistics of a NaN-free 2-D array, as kendalltau uses
+    them: sums over tied groups of size t of t(t-1)/2, t(t-1)(t-2) and
+    t(t-1)(2t+5).
+    """
+    sums = np.zeros((3, X.shape[1]))
+    for column in range(X.shape[1]):
+        t = np.unique(X[:, column], return_counts=True)[1].astype(np.float64)
+        t = t[t > 1]
+        sums[:, column] = [(t * (t - 1) / 2).sum(), (t * (t - 1) * (t - 2)).sum(),
+                           (t * (t - 1) * (2 * t + 5)).sum()]
+    return sums
+
+
+def _pattern_blocks(X):
+    """
+    Yield (rows, columns, in_a, in_b) for every pair of missingness groups:
+    the rows both groups have, the columns of the two groups and masks of
+    which of those columns belong to each group.
+    """
+    present = ~np.isnan(X)
+    patterns, group = np.unique(present.T, axis=0, return_inverse=True)
+    group = group.ravel()
+    for a in range(len(patterns)):
+        for b in range(a, len(patterns)):
+            rows = patterns[a] & patterns[b]
+            columns = np.flatnonzero((group == a) | (group == b))
+            if rows.sum() < 2:
+                continue
+            yield rows, columns, group[columns] == a, group[columns] == b
+
+
+def pairwise_correlation(X, method='pearson'):
+    """
+    Correlation matrix over pairwise-complete rows, as DataFrame.corr does.
+
+    Columns are grouped by their pattern of missing values; every pair of
+    groups is correlated in one matrix operation on the rows both groups
+    have, so a wide matrix with few missingness patterns costs a handful of
+    BLAS calls instead of one call per column pair.
+
+    Returns:
+        tuple: (correlation matrix, matrix of row counts behind each entry)
+    """
+    X = np.asarray(X, dtype=np.float64)
+    complete_correlation = _COMPLETE_CORRELATIONS[method]
+    present = ~np.isnan(X)
+    r = np.full((X.shape[1], X.shape[1]), np.nan)
+    counts = (present.T.astype(np.int64) @ present.astype(np.int64))
+    for rows, columns, in_a, in_b in _pattern_blocks(X):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            block = complete_correlation(X[np.ix_(rows, columns)])
+        r[np.ix_(columns[in_a], columns[in_b])] = block[np.ix_(in_a, in_b)]
+        r[np.ix_(columns[in_b], columns[in_a])] = block[np.ix_(in_b, in_a)]
+    # The diagonal is 1 except for columns with fewer than two values or no
+    # variance, whose self-correlation came out NaN above
+    np.fill_diagonal(r, np.where(np.isnan(np.diag(r)), np.nan, 1.0))
+    return r, counts
+
+
+def kendall_tie_sums(X):
+    """
+    Tie statistics behind each Kendall entry of pairwise_correlation.
+
+    Returns:
+        ndarray: shape (3, columns, columns); [:, i, j] holds the _tie_sums
+        of column i over the rows that columns i and j both have, so the
+        statistics of column j for that pair are [:, j, i]
+    """
+    X = np.asarray(X, dtype=np.float64)
+    ties = np.zeros((3, X.shape[1], X.shape[1]))
+    for rows, columns, in_a, in_b in _pattern_blocks(X):
+        sums = _tie_sums(X[np.ix_(rows, columns)])
+        ties[np.ix_(range(3), columns[in_a], columns[in_b])] = sums[:, in_a, None]
+        ties[np.ix_(range(3), columns[in_b], columns[in_a])] = sums[:, in_b, None]
+    return ties
+
+
+def correlation_pvalues(r, counts, method='pearson', ties=None):
+    """
+    Two-sided p-values for correlation matrices against no association.
+
+    Pearson and Spearman use the t distribution with n - 2 degrees of
+    freedom. Kendall uses the normal approximation to the concordant minus
+    discordant count with the tie-corrected variance of kendalltau, so it
+    needs the tie statistics from kendall_tie_sums.
+    """
+    n = counts.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if method == 'kendall':
+            if ties is None:
+                raise ValueError("Kendall p-values need the tie statistics from kendall_tie_sums")
+            tied, tied_triples, tied_variance = ties
+            pairs = n * (n - 1) / 2
+            m = n * (n - 1)
+            # tau-b back to concordant minus discordant pairs
+            s = r * np.sqrt(pairs - tied) * np.sqrt(pairs - tied.T)
+            variance = ((m * (2 * n + 5) - tied_variance - tied_variance.T) / 18
+                        + 2 * tied * tied.T / m + tied_triples * tied_triples.T / (9 * m * (n - 2)))
+            p = special.erfc(np.abs(s / np.sqrt(variance)) / np.sqrt(2))
+        else:
+            df = n - 2
+            t = r * np.sqrt(df / ((1 - r) * (1 + r)))
+            p = 2 * special.stdtr(df, -np.abs(t))
+    return np.where(n > 2, p, np.nan)
+
+
+def correlate(data, method='pearson'):
+    """
+    Correlation, pair count and p-value matrices for the numeric columns of data.
+
+    Returns:
+        tuple: (r, n, p) DataFrames labelled by column
+    """
+    if method not in CORRELATION_METHODS:
+        raise ValueError(f"Unknown correlation method {method!r}; expected one of {CORRELATION_METHODS}")
+    numeric = data.select_dtypes(include=[np.number])
+    X = numeric.to_numpy(dtype=np.float64)
+    r, counts = pairwise_correlation(X, method)
+    p = correlation_pvalues(r, counts, method, kendall_tie_sums(X) if method == 'kendall' else None)
+    columns = numeric.columns
+    return (pd.DataFrame(r, index=columns, columns=columns),
+            pd.DataFrame(counts, index=columns, columns=columns),
+            pd.DataFrame(p, index=columns, columns=columns))
+
+
+def top_pairs(r_df, p_df=None, n_df=None, k=None):
+    """
+    Distinct column pairs sorted by absolute correlation, strongest first.
+
+    Pairs are taken from the upper triangle (np.triu_indices) and the k
+    strongest are selected with argpartition before sorting, so ranking all
+    pairs of hundreds of columns is a few array operations.
+
+    Returns:
+        DataFrame: var1, var2, correlation and, if given, n and p_value
+    """
+    upper = np.triu_indices(len(r_df.columns), k=1)
+    r = r_df.to_numpy()[upper]
+    strength = np.where(np.isnan(r), -1.0, np.abs(r))
+    if k is not None and k < len(r):
+        selected = np.argpartition(-strength, k)[:k]
+    else:
+        selected = np.arange(len(r))
+    selected = selected[np.argsort(-strength[selected], kind='stable')]
+
+    columns = r_df.columns.to_numpy()
+    pairs = pd.DataFrame({
+        'var1': columns[upper[0][selected]],
+        'var2': columns[upper[1][selected]],
+        'correlation': r[selected],
+    })
+    if n_df is not None:
+        pairs['n'] = n_df.to_numpy()[upper][selected]
+    if p_df is not None:
+        pairs['p_value'] = p_df.to_numpy()[upper][selected]
+    return pairs
+
+
+def describe_strength(correlation):
+    """'very strong positive', 'weak negative', ... for an array of correlations"""
+    magnitude = np.abs(correlation)
+    strength = np.select([magnitude >= 0.8, magnitude >= 0.6, magnitude >= 0.4],
+                         ['very strong', 'strong', 'moderate'], 'weak')
+    direction = np.where(correlation > 0, 'positive', 'negative')
+    return pd.Series(strength, dtype=object) + ' ' + direction
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-m", "--methods", nargs='+', choices=CORRELATION_METHODS, default=list(CORRELATION_METHODS))
+    parser.add_argument("-k", "--top", type=int, default=10, help="number of strongest pairs to list")
+    args = parser.parse_args()
+
+    join_df = load_join_df()
+    for method in args.methods:
+        r_df, n_df, p_df = correlate(join_df, method)
+        pairs = top_pairs(r_df, p_df, n_df, args.top)
+        print(f"\nTop {len(pairs)} {method} correlations:")
+        print(pairs.to_string(index=False, formatters={'correlation': '{:.3f}'.format,
+                                                       'p_value': '{:.2e}'.format}))
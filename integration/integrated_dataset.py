@@ -0,0 +1,301 @@
+import pandas as pd
+import numpy as np
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from usafacts import read_header, read_usafacts
+
+logger = logging.getLogger(__name__)
+
+# State abbreviation to full name mapping
+US_STATE_ABBREV = {
+    'AL': 'Alabama', 'AK': 'Alaska', 'AZ': 'Arizona', 'AR': 'Arkansas',
+    'CA': 'California', 'CO': 'Colorado', 'CT': 'Connecticut', 'DE': 'Delaware',
+    'FL': 'Florida', 'GA': 'Georgia', 'HI': 'Hawaii', 'ID': 'Idaho',
+    'IL': 'Illinois', 'IN': 'Indiana', 'IA': 'Iowa', 'KS': 'Kansas',
+    'KY': 'Kentucky', 'LA': 'Louisiana', 'ME': 'Maine', 'MD': 'Maryland',
+    'MA': 'Massachusetts', 'MI': 'Michigan', 'MN': 'Minnesota', 'MS': 'Mississippi',
+    'MO': 'Missouri', 'MT': 'Montana', 'NE': 'Nebraska', 'NV': 'Nevada',
+    'NH': 'New Hampshire', 'NJ': 'New Jersey', 'NM': 'New Mexico', 'NY': 'New York',
+    'NC': 'North Carolina', 'ND': 'North Dakota', 'OH': 'Ohio', 'OK': 'Oklahoma',
+    'OR': 'Oregon', 'PA': 'Pennsylvania', 'RI': 'Rhode Island', 'SC': 'South Carolina',
+    'SD': 'South Dakota', 'TN': 'Tennessee', 'TX': 'Texas', 'UT': 'Utah',
+    'VT': 'Vermont', 'VA': 'Virginia', 'WA': 'Washington', 'WV': 'West Virginia',
+    'WI': 'Wisconsin', 'WY': 'Wyoming', 'DC': 'District of Columbia'
+}
+
+CASES_FILE = 'covid_confirmed_usafacts.csv'
+DEATHS_FILE = 'covid_deaths_usafacts.csv'
+CENSUS_FILE = 'acs2017_county_data.csv'
+
+# Date of the COVID snapshot joined to the census
+SNAPSHOT_DATE = '2023-07-23'
+CENSUS_COLUMNS = ['CountyId', 'County', 'State', 'TotalPop', 'IncomePerCap', 'Poverty', 'Unemployment']
+# Frames are joined on this integer county code when the usafacts files carry
+# it and the census has its CountyId; otherwise on a "County, State" string key
+FIPS_COLUMN = 'countyFIPS'
+CENSUS_FIPS_COLUMN = 'CountyId'
+
+# Bump whenever the cleaning or join steps change so cached datasets are rebuilt
+PIPELINE_VERSION = 3
+CACHE_DIR = '.integration_cache'
+
+
+def clean_covid_frame(covid_df, by_fips=True):
+    """
+    Clean a usafacts frame and index it by county FIPS code.
+
+    Trailing spaces are stripped from county names, 'Statewide Unallocated'
+    rows (FIPS 0) are dropped and state abbreviations become full names; all
+    other columns are kept as they are. Files without a countyFIPS column,
+    or by_fips=False, are indexed by "County, State" instead.
+    """
+    covid_df = covid_df.copy()
+    covid_df['County Name'] = covid_df['County Name'].str.rstrip()
+    covid_df = covid_df[covid_df['County Name'] != 'Statewide Unallocated']
+    covid_df['State'] = covid_df['State'].map(US_STATE_ABBREV)
+    if by_fips and FIPS_COLUMN in covid_df.columns:
+        covid_df = covid_df[covid_df[FIPS_COLUMN] != 0]
+        return covid_df.set_index(covid_df[FIPS_COLUMN].astype(np.int64)).drop(columns=FIPS_COLUMN)
+    covid_df = covid_df.drop(columns=FIPS_COLUMN, errors='ignore')
+    covid_df['key'] = covid_df['County Name'] + ', ' + covid_df['State']
+    return covid_df.set_index('key')
+
+
+def prepare_covid_frame(covid_df, value_name, date=SNAPSHOT_DATE, by_fips=True):
+    """Clean a usafacts frame and keep the snapshot date as column value_name"""
+    id_columns = [column for column in [FIPS_COLUMN, 'County Name', 'State'] if column in covid_df.columns]
+    covid_df = clean_covid_frame(covid_df[id_columns + [date]], by_fips)
+    return covid_df.rename(columns={date: value_name})
+
+
+def joins_by_fips(cases_df, deaths_df, census_df):
+    """Whether all three raw frames carry the county FIPS code"""
+    return (FIPS_COLUMN in cases_df.columns and FIPS_COLUMN in deaths_df.columns
+            and CENSUS_FIPS_COLUMN in census_df.columns)
+
+
+def prepare_census_frame(census_df, by_fips=True):
+    """Trim the ACS frame to the joined columns and index it by FIPS code or "County, State" """
+    census_df = census_df[[column for column in CENSUS_COLUMNS if column in census_df.columns]].copy()
+    if by_fips:
+        census_df.index = pd.Index(census_df.pop(CENSUS_FIPS_COLUMN).astype(np.int64), name=FIPS_COLUMN)
+        return census_df
+    census_df = census_df.drop(columns=CENSUS_FIPS_COLUMN, errors='ignore')
+    census_df['key'] = census_df['County'] + ', ' + census_df['State']
+    return census_df.set_index('key')
+
+
+def integrate_frames(cases_df, deaths_df, census_df):
+    """Join the prepared frames and add the per capita columns"""
+    covid_df = cases_df.join(deaths_df['Deaths'])
+    census_cols_to_join = ['County', 'TotalPop', 'IncomePerCap', 'Poverty', 'Unemployment']
+    join_df = covid_df.join(census_df[census_cols_to_join])
+    join_df['CasesPerCap'] = join_df['Cases'] / join_df['TotalPop']
+    join_df['DeathsPerCap'] = join_df['Deaths'] / join_df['TotalPop']
+    return join_df
+
+
+def unmatched_report(cases_df, deaths_df, census_df):
+    """
+    Rows of each prepared frame that find no partner in the joins.
+
+    Returns:
+        DataFrame: side, key, County and State of every unmatched row
+    """
+    sides = [
+        ('cases not in deaths', cases_df, deaths_df),
+        ('deaths not in cases', deaths_df, cases_df),
+        ('covid not in census', cases_df, census_df),
+        ('census not in covid', census_df, cases_df),
+    ]
+    reports = []
+    for side, frame, other in sides:
+        unmatched = frame[~frame.index.isin(other.index)]
+        reports.append(pd.DataFrame({
+            'side': side,
+            'key': unmatched.index,
+            'County': unmatched['County Name' if 'County Name' in unmatched.columns else 'County'],
+            'State': unmatched['State'],
+        }))
+    return pd.concat(reports, ignore_index=True)
+
+
+def _read_source(kind, path, dates):
+    start = time.perf_counter()
+    if kind == 'census':
+        # Trimmed census copies have no CountyId; the join then falls back to names
+        header = read_header(path)
+        source_df = pd.read_csv(path, usecols=[column for column in CENSUS_COLUMNS if column in header])
+    else:
+        source_df = read_usafacts(path, dates)
+    return source_df, time.perf_counter() - start
+
+
+def read_sources(cases_path=CASES_FILE, deaths_path=DEATHS_FILE, census_path=CENSUS_FILE,
+                 dates=SNAPSHOT_DATE, processes=3):
+    """
+    Parse the cases, deaths and census CSVs, each in its own worker process.
+
+    The three parses are independent, so wall-clock time approaches the
+    slowest file instead of the sum; processes=1 reads them one after another.
+    Each source's parse time is logged.
+
+    Args:
+        dates: Date column(s) to read from the usafacts files, None for all
+
+    Returns:
+        tuple: raw (cases_df, deaths_df, census_df)
+    """
+    sources = [('cases', cases_path), ('deaths', deaths_path), ('census', census_path)]
+    start = time.perf_counter()
+    if processes == 1:
+        results = [_read_source(kind, path, dates) for kind, path in sources]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processes, len(sources))) as pool:
+            futures = [pool.submit(_read_source, kind, path, dates) for kind, path in sources]
+            results = [future.result() for future in futures]
+
+    for (kind, path), (source_df, seconds) in zip(sources, results):
+        logger.info(f"  {kind}: {path} parsed in {seconds:.2f}s ({len(source_df):,} rows)")
+    logger.info(f"✓ All sources loaded in {time.perf_counter() - start:.2f}s")
+    return tuple(source_df for source_df, _ in results)
+
+
+def load_prepared_frames(cases_path=CASES_FILE, deaths_path=DEATHS_FILE, census_path=CENSUS_FILE,
+                         date=SNAPSHOT_DATE, processes=3):
+    """Read the three sources and clean and key them for the joins"""
+    logger.info("Loading CSV files...")
+    # Only the snapshot's date column is parsed out of the wide usafacts files
+    cases_df, deaths_df, census_df = read_sources(cases_path, deaths_path, census_path, date, processes)
+
+    logger.info("Cleaning and keying the source frames...")
+    by_fips = joins_by_fips(cases_df, deaths_df, census_df)
+    if not by_fips:
+        logger.warning(f"No {FIPS_COLUMN}/{CENSUS_FIPS_COLUMN} column in the source files, "
+                       f"joining on county names")
+    cases_df = prepare_covid_frame(cases_df, 'Cases', date, by_fips)
+    deaths_df = prepare_covid_frame(deaths_df, 'Deaths', date, by_fips)
+    census_df = prepare_census_frame(census_df, by_fips)
+    logger.info(f"  cases_df: {len(cases_df):,} rows, deaths_df: {len(deaths_df):,} rows, "
+                f"census_df: {len(census_df):,} rows")
+    return cases_df, deaths_df, census_df
+
+
+def build_join_df(cases_path=CASES_FILE, deaths_path=DEATHS_FILE, census_path=CENSUS_FILE,
+                  date=SNAPSHOT_DATE, processes=3):
+    """Rebuild the integrated dataset from the raw CSV files"""
+    cases_df, deaths_df, census_df = load_prepared_frames(cases_path, deaths_path, census_path,
+                                                          date, processes)
+
+    report = unmatched_report(cases_df, deaths_df, census_df)
+    for side, count in report['side'].value_counts(sort=False).items():
+        logger.warning(f"  {count:,} rows unmatched: {side}")
+
+    join_df = integrate_frames(cases_df, deaths_df, census_df)
+    logger.info(f"✓ Integrated dataset built: {len(join_df):,} rows")
+    return join_df
+
+
+def source_digests(paths, memo):
+    """
+    BLAKE2b digest of every source file.
+
+    A file whose size and mtime match the memo from the last build is not
+    re-hashed, so checking an up-to-date cache only costs a few stat calls.
+    """
+    digests = {}
+    for path in paths:
+        stat = os.stat(path)
+        known = memo.get(os.path.abspath(path), {})
+        if known.get('size') == stat.st_size and known.get('mtime_ns') == stat.st_mtime_ns:
+            digests[path] = known['digest']
+            continue
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as file:
+            for data in iter(lambda: file.read(1 << 23), b''):
+                digest.update(data)
+        digests[path] = digest.hexdigest()
+    return digests
+
+
+def source_memo(paths, digests):
+    """Size, mtime and digest of every source file, for source_digests() next time"""
+    memo = {}
+    for path in paths:
+        stat = os.stat(path)
+        memo[os.path.abspath(path)] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                       'digest': digests[path]}
+    return memo
+
+
+def load_join_df(cases_path=CASES_FILE, deaths_path=DEATHS_FILE, census_path=CENSUS_FILE,
+                 date=SNAPSHOT_DATE, cache_dir=CACHE_DIR, rebuild=False, processes=3):
+    """
+    Integrated COVID/census dataset, served from cache_dir when possible.
+
+    The cached frame is keyed by the content hashes of the three source
+    files, the snapshot date and PIPELINE_VERSION, so it is rebuilt only when
+    an input or the pipeline changes (or when rebuild=True). A rebuild parses
+    the sources in up to `processes` worker processes.
+
+    Returns:
+        DataFrame: County Name, State, Cases, Deaths, County, TotalPop,
+        IncomePerCap, Poverty, Unemployment, CasesPerCap and DeathsPerCap,
+        indexed by county FIPS code (or "County, State", see clean_covid_frame)
+    """
+    if cache_dir is None:
+        return build_join_df(cases_path, deaths_path, census_path, date, processes)
+
+    paths = [cases_path, deaths_path, census_path]
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+
+    digests = source_digests(paths, manifest.get('sources', {}))
+    key = hashlib.blake2b(json.dumps([PIPELINE_VERSION, date, [digests[path] for path in paths]]).encode(),
+                          digest_size=16).hexdigest()
+    cache_path = os.path.join(cache_dir, f'join_df.{key}.pkl')
+    if not rebuild and os.path.exists(cache_path):
+        join_df = pd.read_pickle(cache_path)
+        logger.info(f"✓ Integrated dataset loaded from cache: {len(join_df):,} rows")
+        return join_df
+
+    join_df = build_join_df(cases_path, deaths_path, census_path, date, processes)
+    os.makedirs(cache_dir, exist_ok=True)
+    for stale in os.listdir(cache_dir):
+        if stale.startswith('join_df.') and stale.endswith('.pkl'):
+            os.remove(os.path.join(cache_dir, stale))
+    # Rename at the end so a crashed run never leaves half a cache behind
+    join_df.to_pickle(cache_path + '.tmp')
+    os.replace(cache_path + '.tmp', cache_path)
+
+    with open(manifest_path, 'w') as manifest_file:
+        json.dump({'sources': source_memo(paths, digests), 'pipeline_version': PIPELINE_VERSION},
+                  manifest_file, indent=1)
+    return join_df
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", default=CASES_FILE)
+    parser.add_argument("--deaths", default=DEATHS_FILE)
+    parser.add_argument("--census", default=CENSUS_FILE)
+    parser.add_argument("--date", default=SNAPSHOT_DATE)
+    parser.add_argument("--rebuild", action='store_true', help="ignore the cache and rebuild")
+    parser.add_argument("--unmatched", help="write the rows each join leaves unmatched to this CSV")
+    args = parser.parse_args()
+
+    join_df = load_join_df(args.cases, args.deaths, args.census, args.date, rebuild=args.rebuild)
+    print(join_df.head())
+    if args.unmatched:
+        report = unmatched_report(*load_prepared_frames(args.cases, args.deaths, args.census, args.date))
+        report.to_csv(args.unmatched, index=False)
+        print(f"{len(report):,} unmatched rows written to {args.unmatched}")
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+import correlations
+from correlations import correlate
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.normal(size=(60, 4)).round(1), columns=list('abcd'))
+    data.loc[rng.choice(60, 15, replace=False), 'b'] = np.nan
+    data.loc[rng.choice(60, 10, replace=False), 'c'] = np.nan
+    data['constant'] = 1.0
+    return data
+
+
+@pytest.mark.parametrize('method', correlations.CORRELATION_METHODS)
+def test_matches_dataframe_corr(data, method, monkeypatch):
+    # A small tile size makes the Kendall loop span several tiles in both directions
+    monkeypatch.setattr(correlations, 'BLOCK_ELEMENTS', 500)
+    r_df, n_df, _ = correlate(data, method)
+    expected = data.corr(method=method)
+    # pandas reports 1 for every Kendall self-correlation, even without variance
+    expected.loc['constant', 'constant'] = np.nan
+    pd.testing.assert_frame_equal(r_df, expected, atol=1e-6)
+    assert n_df.loc['a', 'b'] == data[['a', 'b']].dropna().shape[0]
+    assert np.isnan(r_df.loc['constant', 'constant'])
+
+
+def test_kendall_pvalues_are_tie_corrected():
+    rng = np.random.default_rng(3)
+    base = rng.poisson(3, 200)
+    data = pd.DataFrame({'a': base + rng.poisson(1, 200), 'b': rng.poisson(2, 200) + base // 2,
+                         'c': rng.poisson(1, 200).astype(float)})
+    data.loc[rng.choice(200, 30, replace=False), 'c'] = np.nan
+    _, _, p_df = correlate(data, 'kendall')
+    for x, y in [('a', 'b'), ('a', 'c'), ('b', 'c')]:
+        pair = data[[x, y]].dropna()
+        assert p_df.loc[x, y] == pytest.approx(stats.kendalltau(pair[x], pair[y]).pvalue, rel=1e-9)
@@ -0,0 +1,27 @@
+import os
+import pandas as pd
+from integrated_dataset import load_join_df
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def trimmed(name):
+    return os.path.join(HERE, f'trimmed_{name}.csv')
+
+
+def test_trimmed_files_join_on_names():
+    join_df = load_join_df(trimmed('cases'), trimmed('deaths'), trimmed('census'),
+                           cache_dir=None, processes=1)
+    assert join_df.loc['Autauga County, Alabama', 'Cases'] == 19913
+    assert join_df['TotalPop'].notna().mean() > 0.95
+
+
+def test_fips_usafacts_with_trimmed_census_fall_back_to_names(tmp_path):
+    for kind in ('cases', 'deaths'):
+        covid_df = pd.read_csv(trimmed(kind))
+        covid_df.insert(0, 'countyFIPS', range(1, len(covid_df) + 1))
+        covid_df.to_csv(tmp_path / f'{kind}.csv', index=False)
+
+    join_df = load_join_df(tmp_path / 'cases.csv', tmp_path / 'deaths.csv', trimmed('census'),
+                           cache_dir=None, processes=1)
+    assert join_df.loc['Autauga County, Alabama', 'TotalPop'] > 0
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+from timeseries import build_timeseries, load_timeseries
+
+DATES = ['2023-07-20', '2023-07-21', '2023-07-22']
+
+
+def write_sources(tmp_path, counts):
+    """Wide usafacts cases/deaths files for three counties, plus a census file"""
+    ids = pd.DataFrame({'countyFIPS': [1001, 1003, 1005], 'County Name': ['A County ', 'B County ', 'C County '],
+                        'State': ['AL', 'AL', 'AL'], 'StateFIPS': [1, 1, 1]})
+    for kind, scale in [('cases', 10), ('deaths', 1)]:
+        covid_df = ids.copy()
+        for date, values in counts.items():
+            covid_df[date] = np.asarray(values) * scale
+        covid_df.to_csv(tmp_path / f'{kind}.csv', index=False)
+    pd.DataFrame({'CountyId': [1001, 1003, 1005], 'County': ['A County', 'B County', 'C County'],
+                  'State': ['Alabama'] * 3, 'TotalPop': [100, 200, 400], 'IncomePerCap': [1, 2, 3],
+                  'Poverty': [1.0, 2.0, 3.0], 'Unemployment': [1.0, 2.0, 3.0]}).to_csv(
+        tmp_path / 'census.csv', index=False)
+    return [str(tmp_path / f'{kind}.csv') for kind in ('cases', 'deaths', 'census')]
+
+
+def test_revised_earlier_date_is_picked_up(tmp_path):
+    counts = {date: [day, day + 1, day + 2] for day, date in enumerate(DATES)}
+    sources = write_sources(tmp_path, counts)
+    build_timeseries(*sources, path=str(tmp_path / 'series'), processes=1)
+
+    # Revise a stored date other than the last one and add a new day
+    counts[DATES[1]] = [7, 8, 9]
+    counts['2023-07-23'] = [3, 4, 5]
+    sources = write_sources(tmp_path, counts)
+    updated = load_timeseries(*sources, path=str(tmp_path / 'series'), processes=1, revision_window=2)
+    rebuilt = build_timeseries(*sources, path=str(tmp_path / 'rebuilt'), processes=1)
+
+    assert updated.dates == rebuilt.dates
+    for name in ('cases', 'deaths', 'cases_per_cap', 'deaths_per_cap'):
+        np.testing.assert_array_equal(updated.matrix(name), rebuilt.matrix(name))
+    assert updated.to_frame('cases').loc[1001, DATES[1]] == 70
+
+
+def test_revision_before_window_needs_rebuild(tmp_path):
+    counts = {date: [day, day + 1, day + 2] for day, date in enumerate(DATES)}
+    sources = write_sources(tmp_path, counts)
+    build_timeseries(*sources, path=str(tmp_path / 'series'), processes=1)
+
+    counts[DATES[0]] = [7, 8, 9]
+    counts['2023-07-23'] = [3, 4, 5]
+    sources = write_sources(tmp_path, counts)
+    updated = load_timeseries(*sources, path=str(tmp_path / 'series'), processes=1, revision_window=2)
+    assert updated.to_frame('cases').loc[1001, DATES[0]] == 0
+    rebuilt = load_timeseries(*sources, path=str(tmp_path / 'series'), processes=1, rebuild=True)
+    assert rebuilt.to_frame('cases').loc[1001, DATES[0]] == 70
+
+
+def test_new_days_are_appended(tmp_path):
+    counts = {date: [day, day + 1, day + 2] for day, date in enumerate(DATES)}
+    sources = write_sources(tmp_path, counts)
+    build_timeseries(*sources, path=str(tmp_path / 'series'), processes=1)
+
+    counts['2023-07-23'] = [3, 4, 5]
+    sources = write_sources(tmp_path, counts)
+    updated = load_timeseries(*sources, path=str(tmp_path / 'series'), processes=1)
+    assert updated.dates == DATES + ['2023-07-23']
+    np.testing.assert_array_equal(updated.matrix('deaths', start='2023-07-23')[:, 0], [3, 4, 5])
@@ -0,0 +1,309 @@
+import pandas as pd
+import numpy as np
+import argparse
+import bisect
+import json
+import logging
+import os
+from integrated_dataset import (CASES_FILE, DEATHS_FILE, CENSUS_FILE, CACHE_DIR, CENSUS_FIPS_COLUMN,
+                                FIPS_COLUMN, PIPELINE_VERSION, clean_covid_frame, joins_by_fips,
+                                prepare_census_frame, read_sources, source_digests, source_memo)
+from usafacts import read_usafacts, read_header, resolve_date_columns, DATE_COLUMN_RE
+
+logger = logging.getLogger(__name__)
+
+TIMESERIES_DIR = os.path.join(CACHE_DIR, 'timeseries')
+
+# Matrices of the integrated time series and their on-disk dtypes. Each one
+# is stored date-major (one row of counties per day), so a date range is a
+# contiguous block of the file and new days are appended at the end
+MATRIX_DTYPES = {
+    'cases': np.int32,
+    'deaths': np.int32,
+    'cases_per_cap': np.float32,
+    'deaths_per_cap': np.float32,
+}
+# Number of most recent stored dates that an update re-reads to detect revisions
+REVISION_WINDOW = 30
+
+
+def align_to_census(covid_df, census_index):
+    """
+    Date-major count matrix of a cleaned usafacts frame, aligned to the census.
+
+    Returns:
+        tuple: (matrix of shape (dates, counties) as int32, boolean mask of the
+        census counties that have a usafacts row). Census counties without
+        one are left at 0; usafacts rows without a census county are dropped.
+    """
+    date_columns = [column for column in covid_df.columns if DATE_COLUMN_RE.match(column)]
+    positions = census_index.get_indexer(covid_df.index)
+    found = positions >= 0
+    matrix = np.zeros((len(date_columns), len(census_index)), dtype=np.int32)
+    matrix[:, positions[found]] = covid_df[date_columns].to_numpy(dtype=np.int32)[found].T
+    matched = np.zeros(len(census_index), dtype=bool)
+    matched[positions[found]] = True
+    return matrix, matched
+
+
+def per_capita(counts, population):
+    """Counts divided by each county's population in one broadcast division"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = counts / population.astype(np.float64)
+    return np.where(population > 0, rates, np.nan).astype(np.float32)
+
+
+def _write_matrix(path, matrix, mode='wb'):
+    with open(path, mode) as matrix_file:
+        np.ascontiguousarray(matrix).tofile(matrix_file)
+
+
+def build_timeseries(cases_path=CASES_FILE, deaths_path=DEATHS_FILE, census_path=CENSUS_FILE,
+                     path=TIMESERIES_DIR, processes=3):
+    """
+    Integrate every date of the usafacts files with the census and store the
+    result as raw matrices that CovidTimeSeries memory-maps.
+
+    Files written to path:
+        counties.csv               census columns per county, plus 'matched'
+        <matrix>.bin               one per MATRIX_DTYPES entry, (dates, counties)
+        meta.json                  dates, shapes, dtypes and source digests
+    """
+    logger.info("Reading full usafacts time series...")
+    cases_df, deaths_df, census_df = read_sources(cases_path, deaths_path, census_path, None, processes)
+    by_fips = joins_by_fips(cases_df, deaths_df, census_df)
+    census_df = prepare_census_frame(census_df, by_fips)
+    cases_df = clean_covid_frame(cases_df, by_fips)
+    deaths_df = clean_covid_frame(deaths_df, by_fips)
+
+    dates = [column for column in cases_df.columns if DATE_COLUMN_RE.match(column)]
+    deaths_dates = [column for column in deaths_df.columns if DATE_COLUMN_RE.match(column)]
+    if deaths_dates != dates:
+        # Keep the dates both files have so the matrices stay aligned
+        dates = [date for date in dates if date in set(deaths_dates)]
+        cases_df = cases_df[['County Name', 'State'] + dates]
+        deaths_df = deaths_df[['County Name', 'State'] + dates]
+
+    cases, cases_matched = align_to_census(cases_df, census_df.index)
+    deaths, deaths_matched = align_to_census(deaths_df, census_df.index)
+    population = census_df['TotalPop'].to_numpy()
+    matrices = {
+        'cases': cases,
+        'deaths': deaths,
+        'cases_per_cap': per_capita(cases, population),
+        'deaths_per_cap': per_capita(deaths, population),
+    }
+    census_df['matched'] = cases_matched & deaths_matched
+    logger.info(f"  {len(dates):,} dates x {len(census_df):,} counties, "
+                f"{census_df['matched'].sum():,} counties matched to usafacts")
+
+    os.makedirs(path, exist_ok=True)
+    # Drop meta.json first so an interrupted rebuild is never mistaken for a valid series
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        os.remove(os.path.join(path, 'meta.json'))
+    for name, matrix in matrices.items():
+        _write_matrix(os.path.join(path, f'{name}.bin.tmp'), matrix.astype(MATRIX_DTYPES[name]))
+        os.replace(os.path.join(path, f'{name}.bin.tmp'), os.path.join(path, f'{name}.bin'))
+    census_df.to_csv(os.path.join(path, 'counties.csv'))
+
+    source_paths = [cases_path, deaths_path, census_path]
+    digests = source_digests(source_paths, {})
+    meta = {
+        'pipeline_version': PIPELINE_VERSION,
+        'dates': dates,
+        'n_counties': len(census_df),
+        'dtypes': {name: np.dtype(dtype).name for name, dtype in MATRIX_DTYPES.items()},
+        'sources': source_memo(source_paths, digests),
+    }
+    _write_meta(path, meta)
+    logger.info(f"✓ Time series written to {path}")
+    return CovidTimeSeries(path)
+
+
+def _write_meta(path, meta):
+    # meta.json is written last: it is what makes the matrices valid
+    with open(os.path.join(path, 'meta.json.tmp'), 'w') as meta_file:
+        json.dump(meta, meta_file, indent=1)
+    os.replace(os.path.join(path, 'meta.json.tmp'), os.path.join(path, 'meta.json'))
+
+
+def update_timeseries(cases_path=CASES_FILE, deaths_path=DEATHS_FILE, census_path=CENSUS_FILE,
+                      path=TIMESERIES_DIR, processes=3, revision_window=REVISION_WINDOW):
+    """
+    Bring a stored time series up to date by appending only the new days.
+
+    The dates in both usafacts headers past the last stored date are read
+    together with the last revision_window stored dates. That window is
+    compared with the stored matrices, and if nothing in it was revised the
+    new days are aligned to the stored counties and appended to every
+    matrix, per-capita rates included. A changed census file, pipeline
+    version or revision inside the window falls back to build_timeseries().
+    The new source digests are only recorded after the window was checked.
+
+    Revisions to dates older than the window are not detected; pass
+    rebuild=True to load_timeseries() (--rebuild) to pick those up.
+    """
+    with open(os.path.join(path, 'meta.json')) as meta_file:
+        meta = json.load(meta_file)
+    source_paths = [cases_path, deaths_path, census_path]
+    digests = source_digests(source_paths, meta['sources'])
+    known = {source: memo['digest'] for source, memo in meta['sources'].items()}
+    if (meta.get('pipeline_version') != PIPELINE_VERSION or not meta['dates']
+            or known.get(os.path.abspath(census_path)) != digests[census_path]):
+        logger.info("Census file or pipeline changed, rebuilding the full time series")
+        return build_timeseries(cases_path, deaths_path, census_path, path, processes)
+
+    stored_dates = meta['dates']
+    last_date = stored_dates[-1]
+    headers = [read_header(cases_path), read_header(deaths_path)]
+    new_dates = [date for date in resolve_date_columns(headers[0], start=last_date)
+                 if date > last_date and date in set(headers[1])]
+    if any(not set(stored_dates) <= set(resolve_date_columns(header)) for header in headers):
+        logger.info("Stored dates missing from the source files, rebuilding the full time series")
+        return build_timeseries(cases_path, deaths_path, census_path, path, processes)
+
+    by_fips = (all(FIPS_COLUMN in header for header in headers)
+               and CENSUS_FIPS_COLUMN in read_header(census_path))
+    # Only the most recent stored dates are re-read to look for revisions
+    window_dates = stored_dates[-max(1, revision_window):]
+    series = CovidTimeSeries(path)
+    index = series.counties.index
+    matched = np.ones(len(index), dtype=bool)
+    new_rows = {}
+    for name, source_path in [('cases', cases_path), ('deaths', deaths_path)]:
+        covid_df = clean_covid_frame(read_usafacts(source_path, window_dates + new_dates), by_fips)
+        if covid_df.index.name != index.name:
+            # The file gained or lost its FIPS column since the series was built
+            return build_timeseries(cases_path, deaths_path, census_path, path, processes)
+        matrix, source_matched = align_to_census(covid_df[window_dates + new_dates], index)
+        matched &= source_matched
+        if not np.array_equal(matrix[:len(window_dates)], series._matrices[name][-len(window_dates):]):
+            logger.info(f"{name}: dates since {window_dates[0]} were revised, rebuilding the full time series")
+            return build_timeseries(cases_path, deaths_path, census_path, path, processes)
+        new_rows[name] = matrix[len(window_dates):]
+    if not np.array_equal(matched, series.counties['matched'].to_numpy()):
+        logger.info("Counties were added to or removed from usafacts, rebuilding the full time series")
+        return build_timeseries(cases_path, deaths_path, census_path, path, processes)
+
+    if new_dates:
+        population = series.counties['TotalPop'].to_numpy()
+        new_rows['cases_per_cap'] = per_capita(new_rows['cases'], population)
+        new_rows['deaths_per_cap'] = per_capita(new_rows['deaths'], population)
+        del series
+        for name, rows in new_rows.items():
+            dtype = np.dtype(meta['dtypes'][name])
+            matrix_path = os.path.join(path, f'{name}.bin')
+            # Cut off whatever an interrupted update appended past the stored dates
+            os.truncate(matrix_path, len(stored_dates) * meta['n_counties'] * dtype.itemsize)
+            _write_matrix(matrix_path, rows.astype(dtype), mode='ab')
+        meta['dates'] = stored_dates + new_dates
+
+    meta['sources'] = source_memo(source_paths, digests)
+    _write_meta(path, meta)
+    logger.info(f"✓ Appended {len(new_dates):,} new dates to the time series "
+                f"({meta['dates'][0]} to {meta['dates'][-1]})")
+    return CovidTimeSeries(path)
+
+
+class CovidTimeSeries:
+    """
+    Memory-mapped county x date view of the integrated time series, with
+    counties in the order of the census file.
+
+    The matrices are only paged in for the dates that are actually sliced, so
+    opening the full pandemic history costs a JSON and a CSV read.
+    """
+
+    def __init__(self, path=TIMESERIES_DIR):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as meta_file:
+            self.meta = json.load(meta_file)
+        self.dates = self.meta['dates']
+        self.counties = pd.read_csv(os.path.join(path, 'counties.csv'), index_col=0)
+        shape = (len(self.dates), self.meta['n_counties'])
+        self._matrices = {}
+        for name, dtype in self.meta['dtypes'].items():
+            if len(self.dates):
+                self._matrices[name] = np.memmap(os.path.join(path, f'{name}.bin'), dtype=dtype,
+                                                 mode='r', shape=shape)
+            else:
+                self._matrices[name] = np.zeros(shape, dtype=dtype)
+
+    def date_range(self, start=None, end=None):
+        """Slice of the date axis covering the inclusive range [start, end]"""
+        first = 0 if start is None else bisect.bisect_left(self.dates, start)
+        last = len(self.dates) if end is None else bisect.bisect_right(self.dates, end)
+        return slice(first, last)
+
+    def matrix(self, name, start=None, end=None):
+        """County x date matrix for a date range, as a view on the mapped file"""
+        return self._matrices[name][self.date_range(start, end)].T
+
+    def to_frame(self, name, start=None, end=None):
+        """One matrix as a DataFrame indexed by county key with a column per date"""
+        dates = self.dates[self.date_range(start, end)]
+        return pd.DataFrame(np.asarray(self.matrix(name, start, end)), index=self.counties.index,
+                            columns=pd.Index(dates, name='date'))
+
+    def to_long(self, start=None, end=None):
+        """
+        Long form: one row per county and date with Cases, Deaths, CasesPerCap
+        and DeathsPerCap, restricted to counties matched to usafacts.
+        """
+        dates = self.dates[self.date_range(start, end)]
+        matched = self.counties['matched'].to_numpy()
+        keys = self.counties.index[matched]
+        columns = {'Cases': 'cases', 'Deaths': 'deaths',
+                   'CasesPerCap': 'cases_per_cap', 'DeathsPerCap': 'deaths_per_cap'}
+        return pd.DataFrame({
+            keys.name: np.repeat(keys.to_numpy(), len(dates)),
+            'date': pd.to_datetime(np.tile(dates, len(keys))),
+            **{column: np.asarray(self.matrix(name, start, end))[matched].ravel()
+               for column, name in columns.items()},
+        })
+
+
+def load_timeseries(cases_path=CASES_FILE, deaths_path=DEATHS_FILE, census_path=CENSUS_FILE,
+                    path=TIMESERIES_DIR, rebuild=False, processes=3, revision_window=REVISION_WINDOW):
+    """
+    Integrated time series stored at path, kept in sync with the sources.
+
+    Unchanged sources open the stored series as is; when the usafacts files
+    have changed, update_timeseries() appends just the new days after
+    checking the last revision_window stored dates for revisions.
+    """
+    meta_path = os.path.join(path, 'meta.json')
+    if rebuild or not os.path.exists(meta_path):
+        return build_timeseries(cases_path, deaths_path, census_path, path, processes)
+
+    with open(meta_path) as meta_file:
+        meta = json.load(meta_file)
+    source_paths = [cases_path, deaths_path, census_path]
+    digests = source_digests(source_paths, meta['sources'])
+    known = {source: memo['digest'] for source, memo in meta['sources'].items()}
+    if (meta.get('pipeline_version') == PIPELINE_VERSION
+            and all(known.get(os.path.abspath(source)) == digests[source] for source in source_paths)):
+        logger.info(f"✓ Time series loaded from {path}")
+        return CovidTimeSeries(path)
+    return update_timeseries(cases_path, deaths_path, census_path, path, processes, revision_window)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", default=CASES_FILE)
+    parser.add_argument("--deaths", default=DEATHS_FILE)
+    parser.add_argument("--census", default=CENSUS_FILE)
+    parser.add_argument("--start", help="first date to show (YYYY-MM-DD)")
+    parser.add_argument("--end", help="last date to show (YYYY-MM-DD)")
+    parser.add_argument("--rebuild", action='store_true',
+                        help="ignore the stored series and rebuild (picks up revisions of older dates)")
+    parser.add_argument("--revision-window", type=int, default=REVISION_WINDOW,
+                        help="recent stored dates re-checked for revisions on update")
+    args = parser.parse_args()
+
+    series = load_timeseries(args.cases, args.deaths, args.census, rebuild=args.rebuild,
+                             revision_window=args.revision_window)
+    print(f"{len(series.counties):,} counties x {len(series.dates):,} dates "
+          f"({series.dates[0] if series.dates else '-'} to {series.dates[-1] if series.dates else '-'})")
+    print(series.to_frame('cases_per_cap', args.start, args.end).iloc[:5, -5:])
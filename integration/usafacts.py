@@ -0,0 +1,65 @@
+import pandas as pd
+import numpy as np
+import csv
+import re
+
+# Identifier columns of the usafacts time-series files, in file order;
+# the trimmed copies only carry County Name and State
+ID_COLUMNS = ['countyFIPS', 'County Name', 'State', 'StateFIPS']
+ID_DTYPES = {'countyFIPS': np.int32, 'County Name': str, 'State': str, 'StateFIPS': np.int8}
+# Every other column is one day of cumulative counts
+DATE_COLUMN_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+def read_header(csv_file_path):
+    """Column names of a CSV file, read from its first line only"""
+    with open(csv_file_path, newline='') as csv_file:
+        return next(csv.reader(csv_file))
+
+
+def resolve_date_columns(header, dates=None, start=None, end=None):
+    """
+    Date columns of a usafacts header that match the request.
+
+    Args:
+        header (list): Column names as returned by read_header
+        dates (str or list): Exact date(s), e.g. '2023-07-23'
+        start, end (str): Inclusive date range; either side may be open.
+            With neither dates nor a range, every date column is returned.
+
+    Returns:
+        list: Matching date columns in file order
+    """
+    date_columns = [column for column in header if DATE_COLUMN_RE.match(column)]
+    if dates is not None:
+        dates = [dates] if isinstance(dates, str) else list(dates)
+        missing = sorted(set(dates) - set(date_columns))
+        if missing:
+            raise KeyError(f"Dates not in file: {missing}")
+        wanted = set(dates)
+        return [column for column in date_columns if column in wanted]
+    # ISO dates compare correctly as strings
+    return [column for column in date_columns
+            if (start is None or column >= start) and (end is None or column <= end)]
+
+
+def read_usafacts(csv_file_path, dates=None, start=None, end=None):
+    """
+    Read a usafacts time-series CSV, parsing only the requested date columns.
+
+    The header is resolved first and read_csv gets the identifier columns
+    plus the selected dates as usecols, so one snapshot out of a thousand
+    days parses a handful of columns instead of the whole file. Counts are
+    read as int32 and FIPS codes as small integers.
+
+    Returns:
+        DataFrame: the identifier columns present in the file followed by
+        the selected date columns
+    """
+    header = read_header(csv_file_path)
+    date_columns = resolve_date_columns(header, dates, start, end)
+    id_columns = [column for column in ID_COLUMNS if column in header]
+    dtypes = {column: ID_DTYPES[column] for column in id_columns}
+    dtypes.update({column: np.int32 for column in date_columns})
+    covid_df = pd.read_csv(csv_file_path, usecols=id_columns + date_columns, dtype=dtypes)
+    return covid_df[id_columns + date_columns]
@@ -3,6 +3,7 @@ import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
 import logging
+from integrated_dataset import load_join_df
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
@@ -14,65 +15,9 @@ def visualize_correlations():
     """
     logger.info("Starting correlation visualization")
     
-    # State abbreviation to full name mapping
-    us_state_abbrev = {
-        'AL': 'Alabama', 'AK': 'Alaska', 'AZ': 'Arizona', 'AR': 'Arkansas',
-        'CA': 'California', 'CO': 'Colorado', 'CT': 'Connecticut', 'DE': 'Delaware',
-        'FL': 'Florida', 'GA': 'Georgia', 'HI': 'Hawaii', 'ID': 'Idaho',
-        'IL': 'Illinois', 'IN': 'Indiana', 'IA': 'Iowa', 'KS': 'Kansas',
-        'KY': 'Kentucky', 'LA': 'Louisiana', 'ME': 'Maine', 'MD': 'Maryland',
-        'MA': 'Massachusetts', 'MI': 'Michigan', 'MN': 'Minnesota', 'MS': 'Mississippi',
-        'MO': 'Missouri', 'MT': 'Montana', 'NE': 'Nebraska', 'NV': 'Nevada',
-        'NH': 'New Hampshire', 'NJ': 'New Jersey', 'NM': 'New Mexico', 'NY': 'New York',
-        'NC': 'North Carolina', 'ND': 'North Dakota', 'OH': 'Ohio', 'OK': 'Oklahoma',
-        'OR': 'Oregon', 'PA': 'Pennsylvania', 'RI': 'Rhode Island', 'SC': 'South Carolina',
-        'SD': 'South Dakota', 'TN': 'Tennessee', 'TX': 'Texas', 'UT': 'Utah',
-        'VT': 'Vermont', 'VA': 'Virginia', 'WA': 'Washington', 'WV': 'West Virginia',
-        'WI': 'Wisconsin', 'WY': 'Wyoming', 'DC': 'District of Columbia'
-    }
-    
-    # Rebuild the integrated dataset
-    logger.info("Rebuilding integrated dataset...")
-    
-    # Load and prepare data
-    cases_df = pd.read_csv('covid_confirmed_usafacts.csv')
-    deaths_df = pd.read_csv('covid_deaths_usafacts.csv')
-    census_df = pd.read_csv('acs2017_county_data.csv')
-    
-    # Apply all cleaning steps
-    cases_df = cases_df[['County Name', 'State', '2023-07-23']].copy()
-    deaths_df = deaths_df[['County Name', 'State', '2023-07-23']].copy()
-    census_df = census_df[['County', 'State', 'TotalPop', 'IncomePerCap', 'Poverty', 'Unemployment']].copy()
-    
-    cases_df['County Name'] = cases_df['County Name'].str.rstrip()
-    deaths_df['County Name'] = deaths_df['County Name'].str.rstrip()
-    cases_df = cases_df[cases_df['County Name'] != 'Statewide Unallocated']
-    deaths_df = deaths_df[deaths_df['County Name'] != 'Statewide Unallocated']
-    
-    cases_df['State'] = cases_df['State'].map(us_state_abbrev)
-    deaths_df['State'] = deaths_df['State'].map(us_state_abbrev)
-    
-    cases_df['key'] = cases_df['County Name'] + ', ' + cases_df['State']
-    deaths_df['key'] = deaths_df['County Name'] + ', ' + deaths_df['State']
-    census_df['key'] = census_df['County'] + ', ' + census_df['State']
-    
-    cases_df = cases_df.set_index('key')
-    deaths_df = deaths_df.set_index('key')
-    census_df = census_df.set_index('key')
-    
-    cases_df = cases_df.rename(columns={'2023-07-23': 'Cases'})
-    deaths_df = deaths_df.rename(columns={'2023-07-23': 'Deaths'})
-    
-    # Join the dataframes
-    covid_df = cases_df.join(deaths_df['Deaths'])
-    census_cols_to_join = ['County', 'TotalPop', 'IncomePerCap', 'Poverty', 'Unemployment']
-    join_df = covid_df.join(census_df[census_cols_to_join])
-    
-    # Add per capita columns
-    join_df['CasesPerCap'] = join_df['Cases'] / join_df['TotalPop']
-    join_df['DeathsPerCap'] = join_df['Deaths'] / join_df['TotalPop']
-    
-    logger.info(f"✓ Dataset rebuilt: {len(join_df):,} rows")
+    # Load the integrated dataset (rebuilt only when the source CSVs change)
+    logger.info("Loading integrated dataset...")
+    join_df = load_join_df()
     
     # Create correlation matrix for numeric columns only
     logger.info("Computing correlation matrix...")
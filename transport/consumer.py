@@ -0,0 +1,176 @@
+import pandas as pd
+import numpy as np
+import argparse
+import os
+
+# Columns that identify a single breadcrumb reading
+DEDUP_KEY = ['EVENT_NO_TRIP', 'ACT_TIME', 'VEHICLE_ID']
+
+
+def dedup_keys(df):
+    """
+    DEDUP_KEY columns as int64, so a key hashes the same whether its batch
+    was parsed as integers, floats (a column with NaN) or strings.
+    """
+    return pd.DataFrame({column: pd.to_numeric(df[column]).astype(np.int64) for column in DEDUP_KEY})
+
+
+class BreadcrumbDedupStore:
+    """
+    Rolling Bloom filter over breadcrumb keys with a fixed memory budget.
+
+    The budget is split between a current and a previous generation. New
+    keys go into the current one; once it holds expected_items keys it
+    becomes the previous generation and the older one is cleared. The
+    false positive rate therefore stays bounded however long the consumer
+    runs. A replay is recognised as long as its key is in either generation,
+    which covers at least the last expected_items keys. Older replays are
+    processed again, which at-least-once consumers must tolerate anyway.
+
+    Membership checks never touch the database: a recent replayed
+    breadcrumb is always recognised, and a new breadcrumb is wrongly treated
+    as a replay with probability close to `false_positive_rate()`.
+    """
+
+    def __init__(self, memory_bytes=16 * 1024 * 1024, expected_items=5_000_000):
+        generation_bytes = max(1, int(memory_bytes) // 2)
+        self.n_bits = generation_bytes * 8
+        self.expected_items = int(expected_items)
+        # Optimal number of hash functions for one generation's bits and load
+        self.n_hashes = max(1, int(round(self.n_bits / self.expected_items * np.log(2))))
+        # Row 0 is the current generation, row 1 the previous one
+        self.bits = np.zeros((2, generation_bytes), dtype=np.uint8)
+        self.n_added = np.zeros(2, dtype=np.int64)
+
+    def rotate(self):
+        """Start a new generation, forgetting the keys of the previous one"""
+        self.bits[1] = self.bits[0]
+        self.bits[0] = 0
+        self.n_added[1] = self.n_added[0]
+        self.n_added[0] = 0
+
+    def _positions(self, df):
+        # One 64-bit hash per row, then k positions by double hashing
+        h1 = pd.util.hash_pandas_object(dedup_keys(df), index=False).to_numpy(dtype=np.uint64)
+        h2 = (h1 * np.uint64(0x9E3779B97F4A7C15)) ^ (h1 >> np.uint64(31))
+        h2 |= np.uint64(1)
+        steps = np.arange(self.n_hashes, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            positions = h1[:, None] + steps[None, :] * h2[:, None]
+        return positions % np.uint64(self.n_bits)
+
+    def contains(self, df):
+        """Return a boolean array: True where the row was (probably) seen before"""
+        if len(df) == 0:
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(df)
+        masks = np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8))
+        byte_positions = positions >> np.uint64(3)
+        return np.logical_or.reduce([((bits[byte_positions] & masks) != 0).all(axis=1) for bits in self.bits])
+
+    def add(self, df):
+        """Record every row of df as seen (rows with a missing key are skipped)"""
+        df = df[df[DEDUP_KEY].notna().all(axis=1)]
+        if len(df) == 0:
+            return
+        if self.n_added[0] >= self.expected_items:
+            self.rotate()
+        positions = self._positions(df).ravel()
+        masks = np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8))
+        np.bitwise_or.at(self.bits[0], positions >> np.uint64(3), masks)
+        self.n_added[0] += len(df)
+
+    def filter_new(self, df):
+        """
+        Drop replayed rows from a batch.
+
+        The remaining rows are not recorded: call add() with them once they
+        have been processed, so a failure in between does not lose them.
+        Rows with a missing key cannot be deduplicated and are always kept.
+
+        Args:
+            df (DataFrame): Breadcrumb batch containing the DEDUP_KEY columns
+
+        Returns:
+            DataFrame: Only the rows that have not been seen before
+        """
+        keyed = df[DEDUP_KEY].notna().all(axis=1).to_numpy()
+        fresh = ~keyed
+        if keyed.any():
+            keyed_rows = df[keyed]
+            # Duplicates inside the batch itself are caught before the filter
+            fresh[keyed] = ~dedup_keys(keyed_rows).duplicated().to_numpy() & ~self.contains(keyed_rows)
+        return df[fresh]
+
+    def false_positive_rate(self):
+        """Estimated probability that an unseen key is reported as seen"""
+        fill = 1.0 - np.exp(-self.n_hashes * self.n_added / self.n_bits)
+        return 1.0 - np.prod(1.0 - fill ** self.n_hashes)
+
+    def save(self, path):
+        """Write the store to exactly path (no .npz is appended), replacing it atomically"""
+        with open(f'{path}.tmp', 'wb') as store_file:
+            np.savez(store_file, bits=self.bits,
+                     meta=np.array([self.n_bits, self.expected_items, self.n_hashes, *self.n_added]))
+        os.replace(f'{path}.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            n_bits, expected_items, n_hashes, *n_added = (int(v) for v in data['meta'])
+            store = cls(memory_bytes=n_bits // 4, expected_items=expected_items)
+            store.n_hashes = n_hashes
+            store.n_added = np.array(n_added, dtype=np.int64)
+            store.bits = data['bits'].copy()
+        return store
+
+
+def consume_breadcrumbs(file_path, store_path='breadcrumb_dedup.npz', chunksize=100_000,
+                        memory_bytes=16 * 1024 * 1024, expected_items=5_000_000, process=None):
+    """
+    Read a breadcrumb file batch by batch, skipping rows already consumed.
+
+    Each batch's new rows are handed to process (e.g. a database load);
+    only after it returns are their keys added to the dedup store and the
+    store saved to store_path. A restarted consumer therefore skips
+    everything that was processed, and retries a batch that failed midway.
+
+    Returns:
+        DataFrame: The breadcrumbs that were new in this run
+    """
+    if os.path.exists(store_path):
+        store = BreadcrumbDedupStore.load(store_path)
+        print(f"Loaded dedup store with {store.n_added.sum()} keys")
+    else:
+        store = BreadcrumbDedupStore(memory_bytes, expected_items)
+
+    new_batches = []
+    total_rows = 0
+    for batch in pd.read_csv(file_path, chunksize=chunksize):
+        total_rows += len(batch)
+        new_rows = store.filter_new(batch)
+        if len(new_rows) > 0:
+            if process is not None:
+                process(new_rows)
+            new_batches.append(new_rows)
+        store.add(new_rows)
+        store.save(store_path)
+
+    new_df = pd.concat(new_batches, ignore_index=True) if new_batches else pd.DataFrame()
+    print(f"Batches read: {total_rows} rows, new: {len(new_df)}, replayed: {total_rows - len(new_df)}")
+    print(f"Estimated false positive rate: {store.false_positive_rate():.2e}")
+    return new_df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--file", default='bc_trip259172515_230215.csv')
+    parser.add_argument("-s", "--store", default='breadcrumb_dedup.npz')
+    parser.add_argument("-c", "--chunksize", type=int, default=100_000)
+    parser.add_argument("-m", "--memory-mb", type=int, default=16)
+    parser.add_argument("-e", "--expected-items", type=int, default=5_000_000,
+                        help="keys per dedup generation before the store rolls over")
+    args = parser.parse_args()
+
+    consume_breadcrumbs(args.file, args.store, args.chunksize,
+                        memory_bytes=args.memory_mb * 1024 * 1024, expected_items=args.expected_items)
@@ -0,0 +1,215 @@
+import pandas as pd
+import numpy as np
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# Relative accuracy of the quantile sketch (1% of the reported value)
+SKETCH_ACCURACY = 0.01
+SKETCH_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+# Speeds closer to zero than this share the zero bucket
+SKETCH_MIN_VALUE = 1e-6
+# Keeps bucket indices of tiny magnitudes positive so the sign can carry the sign of the speed
+SKETCH_BIAS = 2048
+
+QUANTILES = {'p50': 0.50, 'p95': 0.95, 'p99': 0.99}
+LEVELS = {'vehicle': 'VEHICLE_ID', 'trip': 'EVENT_NO_TRIP'}
+
+
+def sketch_buckets(values):
+    """Map speeds to signed logarithmic bucket keys (0 is the zero bucket)"""
+    values = np.asarray(values, dtype=float)
+    magnitude = np.abs(values)
+    keys = np.zeros(len(values), dtype=np.int64)
+    nonzero = magnitude > SKETCH_MIN_VALUE
+    idx = np.ceil(np.log(magnitude[nonzero]) / np.log(SKETCH_GAMMA)).astype(np.int64)
+    keys[nonzero] = np.sign(values[nonzero]).astype(np.int64) * (idx + SKETCH_BIAS)
+    return keys
+
+
+def bucket_values(keys):
+    """Representative speed of each bucket key"""
+    keys = np.asarray(keys, dtype=np.int64)
+    idx = np.abs(keys) - SKETCH_BIAS
+    values = np.sign(keys) * 2 * SKETCH_GAMMA ** idx / (SKETCH_GAMMA + 1)
+    return np.where(keys == 0, 0.0, values)
+
+
+def merge_moments(a, b):
+    """Merge two count/min/max/mean/m2 frames indexed by group (Chan et al.)"""
+    if a is None or len(a) == 0:
+        return b
+    if b is None or len(b) == 0:
+        return a
+    index = a.index.union(b.index)
+    a = a.reindex(index)
+    b = b.reindex(index)
+    na = a['count'].fillna(0)
+    nb = b['count'].fillna(0)
+    n = na + nb
+    delta = b['mean'].fillna(0) - a['mean'].fillna(0)
+    merged = pd.DataFrame(index=index)
+    merged['count'] = n.astype(np.int64)
+    merged['min'] = np.fmin(a['min'], b['min'])
+    merged['max'] = np.fmax(a['max'], b['max'])
+    merged['mean'] = np.where(na == 0, b['mean'], np.where(nb == 0, a['mean'], a['mean'] + delta * nb / n))
+    merged['m2'] = (a['m2'].fillna(0) + b['m2'].fillna(0) + delta ** 2 * na * nb / n)
+    return merged
+
+
+def sketch_quantiles(sketch, quantiles=QUANTILES):
+    """
+    Read quantiles out of a sketch.
+
+    Args:
+        sketch (Series): Counts indexed by (group, bucket key)
+
+    Returns:
+        DataFrame: One column per quantile, indexed by group
+    """
+    frame = sketch.rename('n').reset_index()
+    frame.columns = ['group', 'bucket', 'n']
+    frame['value'] = bucket_values(frame['bucket'].to_numpy())
+    frame = frame.sort_values(['group', 'value'], kind='stable')
+    cum = frame.groupby('group')['n'].cumsum()
+    total = frame.groupby('group')['n'].transform('sum')
+
+    result = pd.DataFrame(index=pd.Index(frame['group'].unique(), name=sketch.index.names[0]))
+    for name, q in quantiles.items():
+        # First bucket whose cumulative count passes the rank of the quantile
+        reached = frame[cum > q * (total - 1)]
+        result[name] = reached.groupby('group')['value'].first()
+    return result
+
+
+# Columns of the per-trip reading carried from one chunk to the next
+CARRY_DTYPES = {'EVENT_NO_TRIP': np.int64, 'VEHICLE_ID': np.int64, 'METERS': np.float64, 'SECONDS': np.float64}
+
+
+class SpeedAggregator:
+    """
+    Single-pass per-vehicle and per-trip SPEED statistics.
+
+    Feed breadcrumb chunks with update(); aggregators built on different
+    chunks or in different processes are combined with merge().
+    """
+
+    def __init__(self):
+        self.moments = {level: None for level in LEVELS}
+        self.sketches = {level: None for level in LEVELS}
+        # Last reading of each trip so speeds continue across chunk boundaries
+        self.carry = pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in CARRY_DTYPES.items()})
+
+    def update(self, chunk):
+        speeds = compute_speeds(chunk, self.carry)
+        last = speeds.groupby('EVENT_NO_TRIP', sort=False).tail(1)
+        self.carry = (pd.concat([self.carry, last[self.carry.columns]], ignore_index=True)
+                      .drop_duplicates('EVENT_NO_TRIP', keep='last')
+                      .astype(CARRY_DTYPES))
+
+        for level, column in LEVELS.items():
+            grouped = speeds.groupby(column)['SPEED']
+            stats = grouped.agg(['count', 'min', 'max', 'mean', 'var'])
+            stats['m2'] = (stats['var'] * (stats['count'] - 1)).fillna(0)
+            self.moments[level] = merge_moments(self.moments[level], stats.drop(columns='var'))
+
+            buckets = speeds[[column]].assign(bucket=sketch_buckets(speeds['SPEED']))
+            counts = buckets.groupby([column, 'bucket']).size()
+            if self.sketches[level] is None:
+                self.sketches[level] = counts
+            else:
+                self.sketches[level] = self.sketches[level].add(counts, fill_value=0).astype(np.int64)
+        return self
+
+    def merge(self, other):
+        for level in LEVELS:
+            self.moments[level] = merge_moments(self.moments[level], other.moments[level])
+            if self.sketches[level] is None:
+                self.sketches[level] = other.sketches[level]
+            elif other.sketches[level] is not None:
+                self.sketches[level] = self.sketches[level].add(other.sketches[level], fill_value=0).astype(np.int64)
+        self.carry = (pd.concat([self.carry, other.carry], ignore_index=True)
+                      .drop_duplicates('EVENT_NO_TRIP', keep='last'))
+        return self
+
+    def report(self, level='vehicle'):
+        """Per-group count/min/max/mean/variance and quantiles (m/s)"""
+        moments = self.moments[level]
+        if moments is None:
+            return pd.DataFrame()
+        result = moments[['count', 'min', 'max', 'mean']].copy()
+        result['variance'] = np.where(moments['count'] > 1, moments['m2'] / (moments['count'] - 1), np.nan)
+        return result.join(sketch_quantiles(self.sketches[level]))
+
+    def fleet_report(self):
+        """Fleet-wide statistics built from the per-vehicle aggregates"""
+        moments = self.moments['vehicle']
+        n = moments['count'].sum()
+        mean = (moments['count'] * moments['mean']).sum() / n
+        m2 = moments['m2'].sum() + (moments['count'] * (moments['mean'] - mean) ** 2).sum()
+        fleet = pd.DataFrame({'count': [n], 'min': [moments['min'].min()], 'max': [moments['max'].max()],
+                              'mean': [mean], 'm2': [m2]}, index=pd.Index(['fleet'], name='group'))
+        sketch = self.sketches['vehicle'].groupby(level='bucket').sum()
+        sketch.index = pd.MultiIndex.from_product([['fleet'], sketch.index], names=['group', 'bucket'])
+        result = fleet[['count', 'min', 'max', 'mean']].copy()
+        result['variance'] = fleet['m2'] / (fleet['count'] - 1)
+        return result.join(sketch_quantiles(sketch))
+
+
+def compute_speeds(chunk, carry=None):
+    """
+    Vectorized SPEED for a breadcrumb chunk, continuing each trip from carry.
+
+    The first reading of a trip gets speed 0, matching load_and_enhance_data.
+    """
+    base = pd.to_datetime(chunk['OPD_DATE'], format='%d%b%Y:%H:%M:%S')
+    df = pd.DataFrame({
+        'EVENT_NO_TRIP': chunk['EVENT_NO_TRIP'].to_numpy(),
+        'VEHICLE_ID': chunk['VEHICLE_ID'].to_numpy(),
+        'METERS': chunk['METERS'].to_numpy(dtype=float),
+        'SECONDS': (base - pd.Timestamp(0)).dt.total_seconds().to_numpy() + chunk['ACT_TIME'].to_numpy(),
+        'carried': False,
+    })
+    if carry is not None and len(carry) > 0:
+        df = pd.concat([carry.assign(carried=True), df], ignore_index=True)
+    df = df.sort_values(['EVENT_NO_TRIP', 'SECONDS'], kind='stable')
+
+    grouped = df.groupby('EVENT_NO_TRIP', sort=False)
+    d_meters = grouped['METERS'].diff().to_numpy(dtype=np.float64)
+    d_seconds = grouped['SECONDS'].diff().to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['SPEED'] = np.where(d_seconds > 0, d_meters / d_seconds, 0.0)
+    return df[~df['carried'].astype(bool)].drop(columns='carried')
+
+
+def aggregate_file(file_path, chunksize=500_000):
+    aggregator = SpeedAggregator()
+    for chunk in pd.read_csv(file_path, chunksize=chunksize,
+                             usecols=['EVENT_NO_TRIP', 'OPD_DATE', 'VEHICLE_ID', 'METERS', 'ACT_TIME']):
+        aggregator.update(chunk)
+    return aggregator
+
+
+def aggregate_files(file_paths, processes=None, chunksize=500_000):
+    """Aggregate several breadcrumb files in worker processes and merge the results"""
+    total = SpeedAggregator()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for aggregator in pool.map(aggregate_file, file_paths, [chunksize] * len(file_paths)):
+            total.merge(aggregator)
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs='*', default=['bc_trip259172515_230215.csv'])
+    parser.add_argument("-p", "--processes", type=int, default=None)
+    parser.add_argument("-c", "--chunksize", type=int, default=500_000)
+    args = parser.parse_args()
+
+    aggregator = aggregate_files(args.files, args.processes, args.chunksize)
+
+    print("\nFleet speed statistics (meters per second):")
+    print(aggregator.fleet_report().round(2))
+    print("\nPer-vehicle speed statistics (meters per second):")
+    print(aggregator.report('vehicle').round(2))
+    print("\nPer-trip speed statistics (meters per second):")
+    print(aggregator.report('trip').round(2))
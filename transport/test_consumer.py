@@ -0,0 +1,59 @@
+import os
+import pandas as pd
+import numpy as np
+import pytest
+from consumer import BreadcrumbDedupStore, consume_breadcrumbs
+
+
+def make_batch(trips, times, vehicles):
+    return pd.DataFrame({'EVENT_NO_TRIP': trips, 'ACT_TIME': times, 'VEHICLE_ID': vehicles,
+                         'METERS': np.arange(len(trips))})
+
+
+def test_same_key_matches_across_dtypes():
+    store = BreadcrumbDedupStore(memory_bytes=1 << 16, expected_items=1000)
+    ints = make_batch([259172515, 259172515], [20469, 20474], [4223, 4223])
+    store.add(store.filter_new(ints))
+
+    floats = ints.astype({'ACT_TIME': np.float64})
+    floats.loc[len(floats)] = [259172515, np.nan, 4223, 3]
+    strings = ints.astype(str)
+    assert len(store.filter_new(floats)) == 1  # only the row whose key is incomplete
+    assert len(store.filter_new(strings)) == 0
+
+
+def test_failed_batch_is_not_marked_seen(tmp_path):
+    csv_path = tmp_path / 'breadcrumbs.csv'
+    store_path = str(tmp_path / 'dedup.npz')
+    make_batch([1, 1, 2], [10, 20, 10], [7, 7, 7]).to_csv(csv_path, index=False)
+
+    def fail(new_rows):
+        raise RuntimeError("database unavailable")
+
+    with pytest.raises(RuntimeError):
+        consume_breadcrumbs(csv_path, store_path, memory_bytes=1 << 16, expected_items=1000, process=fail)
+    assert len(consume_breadcrumbs(csv_path, store_path, memory_bytes=1 << 16, expected_items=1000)) == 3
+    assert len(consume_breadcrumbs(csv_path, store_path, memory_bytes=1 << 16, expected_items=1000)) == 0
+
+
+def test_store_path_without_suffix_is_reloaded(tmp_path):
+    csv_path = tmp_path / 'breadcrumbs.csv'
+    store_path = str(tmp_path / 'mystore')
+    make_batch([1, 1, 2], [10, 20, 10], [7, 7, 7]).to_csv(csv_path, index=False)
+
+    assert len(consume_breadcrumbs(csv_path, store_path, memory_bytes=1 << 16, expected_items=1000)) == 3
+    assert len(consume_breadcrumbs(csv_path, store_path, memory_bytes=1 << 16, expected_items=1000)) == 0
+    assert sorted(os.listdir(tmp_path)) == ['breadcrumbs.csv', 'mystore']
+
+
+def test_store_rolls_over_and_keeps_recent_keys():
+    store = BreadcrumbDedupStore(memory_bytes=1 << 12, expected_items=100)
+    batches = [make_batch([trip] * 100, range(100), [7] * 100) for trip in range(5)]
+    for batch in batches:
+        store.add(store.filter_new(batch))
+        assert store.n_added.max() <= 100
+
+    assert store.false_positive_rate() < 0.01
+    assert len(store.filter_new(batches[-1])) == 0
+    assert len(store.filter_new(batches[-2])) == 0
+    assert len(store.filter_new(batches[0])) > 90
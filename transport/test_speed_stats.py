@@ -0,0 +1,18 @@
+import os
+import pandas as pd
+from speed_stats import aggregate_file
+
+BREADCRUMBS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bc_trip259172515_230215.csv')
+
+
+def test_chunked_trip_with_repeated_reading_matches_one_chunk(tmp_path):
+    breadcrumbs = pd.read_csv(BREADCRUMBS)
+    # A duplicate reading (zero time delta) in the second chunk of the trip
+    breadcrumbs = pd.concat([breadcrumbs.iloc[:71], breadcrumbs.iloc[70:]], ignore_index=True)
+    path = tmp_path / 'breadcrumbs.csv'
+    breadcrumbs.to_csv(path, index=False)
+
+    chunked = aggregate_file(path, chunksize=50).report('trip')
+    whole = aggregate_file(path, chunksize=len(breadcrumbs)).report('trip')
+    pd.testing.assert_frame_equal(chunked, whole, check_exact=False)
+    assert chunked['count'].iloc[0] == len(breadcrumbs)